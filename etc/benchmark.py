@@ -0,0 +1,203 @@
+# This script measures the performance of the paths that matter most to students:
+# starting up (importing the module and loading the data), decoding the data,
+# preparing test cases and judging them. Results are written as JSON so that two
+# versions can be diffed before a new SOFTWARE_VERSION is released.
+#
+#   python etc/benchmark.py [output.json]       (default: benchmark.json)
+#
+# It can be run from anywhere; it works on a temporary copy of the data.
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+
+PROJECT_DIRECTORY = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT_FILENAME = 'benchmark.json'
+STARTUP_RUNS = 5
+DECODE_RUNS = 5
+DECODE_SCALES = [1, 4, 16]
+PAIRS_RUNS = 200
+
+OUTPUT_PATH = Path(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_OUTPUT_FILENAME)
+OUTPUT_PATH = OUTPUT_PATH.resolve()
+os.chdir(PROJECT_DIRECTORY)
+sys.path.insert(0, str(PROJECT_DIRECTORY))
+import learninformatics as li
+
+def percentile(values, p):
+    """The p-th percentile (0-100) of a non-empty list of numbers."""
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+def timings(values):
+    """A summary of a list of durations in seconds."""
+    return {'runs': len(values), 'min': min(values), 'p50': percentile(values, 50),
+            'p99': percentile(values, 99), 'max': max(values)}
+
+def load_data():
+    """The contents of the data file, fully decoded into a dictionary."""
+    data = li.LIData.__new__(li.LIData)._data_from_file()
+    return {codename: data[codename] for codename in data}
+
+def scaled_data(data, scale):
+    """A copy of the data with every problem repeated _scale_ times (under new
+       codenames), to see how decoding grows with the dataset."""
+    result = {'meta': dict(data['meta'], mapping=dict(data['meta']['mapping']))}
+    for codename, problem in data.items():
+        if codename == 'meta':
+            continue
+        for k in range(scale):
+            result[codename if k == 0 else f'{codename}~{k}'] = problem
+    return result
+
+def bench_startup(directory, with_container, load_data=True):
+    """Time 'import learninformatics' in a fresh interpreter, followed by loading
+       the data (as the first l.test or l.judge does) unless load_data is False,
+       with or without a matching DATA.bin alongside DATA2.txt."""
+    code = 'import learninformatics as l'
+    if load_data:
+        code += '; l.Interface.ensure_data()'
+    results = []
+    for _ in range(STARTUP_RUNS):
+        if not with_container:
+            Path(directory, li.CONTAINER_FILENAME).unlink(missing_ok=True)
+            shutil.rmtree(Path(directory, li.CACHE_DIRECTORY), ignore_errors=True)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=directory,
+                       env=dict(os.environ, PYTHONPATH=str(PROJECT_DIRECTORY)),
+                       stdout=subprocess.DEVNULL, check=True)
+        results.append(time.perf_counter() - start)
+    return timings(results)
+
+def bench_decode(directory, data):
+    """Time LIData._data_from_file and the Container load for the data at several
+       scales."""
+    results = dict()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        for scale in DECODE_SCALES:
+            big = scaled_data(data, scale)
+            Path(li.PACKED_FILENAME).write_bytes(li.Updater.encode_data(big))
+            li.Container.write(big, li.CONTAINER_FILENAME, li.PACKED_FILENAME)
+            lidata = li.LIData.__new__(li.LIData)
+            decode, container = [], []
+            for _ in range(DECODE_RUNS):
+                start = time.perf_counter()
+                lidata._data_from_file()
+                decode.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                lidata._data_from_container().close()
+                container.append(time.perf_counter() - start)
+            results[f'x{scale}'] = {'bytes': Path(li.PACKED_FILENAME).stat().st_size,
+                                    'data_from_file': timings(decode),
+                                    'data_from_container': timings(container)}
+    finally:
+        os.chdir(cwd)
+    return results
+
+def bench_pairs(data):
+    """Time Judge.input_output_pairs over the samples and judge data of every
+       problem."""
+    problems = [p for c, p in data.items() if c != 'meta']
+    n = 0
+    start = time.perf_counter()
+    for _ in range(PAIRS_RUNS):
+        for pd in problems:
+            for dataset in ['samples', 'judge']:
+                pairs = li.Judge.input_output_pairs(pd[dataset], pd['newline'])
+                n += sum(1 for _ in pairs)
+    elapsed = time.perf_counter() - start
+    return {'pairs': n, 'seconds': elapsed, 'pairs_per_second': n / elapsed}
+
+def reference_solution(pd, pairs):
+    """The AutoJudge reference for problems that have one; otherwise an 'oracle'
+       that looks the answer up in the problem's own data. The oracle does no
+       work of its own, so with it the benchmark measures pure judging
+       overhead."""
+    if 'auto' in pd:
+        return getattr(li.AutoJudge, pd['auto']['generator'] + '_reference')
+    answers = dict(pairs)
+    def oracle(IN, OUT):
+        OUT.write(answers.get(IN.read(), ''))
+    return oracle
+
+def bench_judge(data, workers):
+    """Judge every exercise in the mapping with its reference solution, timing the
+       gap between successive results (the per-case latency seen by the user)."""
+    latencies, per_exercise, n_cases, n_ac = [], dict(), 0, 0
+    start_all = time.perf_counter()
+    for number, codename in data['meta']['mapping'].items():
+        pd = data[codename]
+        pairs = []
+        for dataset in ['samples', 'judge']:
+            cases = li.Judge.input_output_pairs(pd[dataset], pd['newline'])
+            pairs.extend(li.CaseSet(cases))
+        pairs.extend(li.CaseSet(li.Judge.auto_pairs(pd)))
+        function = reference_solution(pd, pairs)
+        start = previous = time.perf_counter()
+        comparison = li.Judge.comparison(pd)
+        for result in li.Judge.iter_results(function, pairs, workers, **comparison):
+            now = time.perf_counter()
+            latencies.append(now - previous)
+            previous = now
+            n_cases += 1
+            n_ac += result.status == 'AC'
+        seconds = time.perf_counter() - start
+        per_exercise[number] = {'cases': len(pairs), 'seconds': seconds}
+    elapsed = time.perf_counter() - start_all
+    return {'workers': workers, 'cases': n_cases, 'accepted': n_ac, 'seconds': elapsed,
+            'cases_per_second': n_cases / elapsed, 'latency': timings(latencies),
+            'exercises': per_exercise}
+
+def run_benchmarks():
+    data = load_data()
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(li.PACKED_FILENAME, directory)
+        startup_import = bench_startup(directory, with_container=False, load_data=False)
+        startup_cold = bench_startup(directory, with_container=False)
+        startup_warm = bench_startup(directory, with_container=True)
+        decode = bench_decode(directory, data)
+    return {
+        'software_version': li.SOFTWARE_VERSION,
+        'data_version': data['meta']['data_version'],
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'when': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'startup': {'import_only': startup_import, 'without_container': startup_cold,
+                    'with_container': startup_warm},
+        'decode': decode,
+        'input_output_pairs': bench_pairs(data),
+        'judge': {'serial': bench_judge(data, 1),
+                  'parallel': bench_judge(data, os.cpu_count() or 1)},
+    }
+
+def print_summary(results):
+    startup = results['startup']
+    print(f"Import only:            p50 {startup['import_only']['p50']:.3f} s")
+    print(f"Startup (no DATA.bin):  p50 {startup['without_container']['p50']:.3f} s")
+    print(f"Startup (DATA.bin):     p50 {startup['with_container']['p50']:.3f} s")
+    for scale, x in results['decode'].items():
+        from_file, from_container = x['data_from_file'], x['data_from_container']
+        print(f"Decode {scale:>4}:            p50 {from_file['p50']*1000:.2f} ms "
+              f"(container {from_container['p50']*1000:.2f} ms)")
+    rate = results['input_output_pairs']['pairs_per_second']
+    print(f"input_output_pairs:     {rate:.0f} pairs/s")
+    for mode, x in results['judge'].items():
+        latency = x['latency']
+        print(f"Judge ({mode}, {x['workers']}):   {x['cases_per_second']:.0f} cases/s, "
+              f"p50 {latency['p50']*1000:.2f} ms, p99 {latency['p99']*1000:.2f} ms")
+
+
+results = run_benchmarks()
+OUTPUT_PATH.write_text(json.dumps(results, indent=2) + '\n')
+print_summary(results)
+print(f'Wrote {OUTPUT_PATH}')
@@ -1,36 +1,322 @@
+# This script builds the published data from the private YAML file
+# etc/datasets/private.yaml, after checking that it is valid:
+#  * DATA2.txt: every problem as compressed, checksummed JSON (see Container in
+#    learninformatics.py), base64-encoded
+#  * DATA.txt: all the data as base64-encoded JSON, the only format that software
+#    before version 2.4 can read (it is what DATA_URL serves them)
+#  * tests/NAME.gz: the input of each large test
+#  * patches/OLD-NEW.json: the problems that changed since the previous version,
+#    and since every earlier version that has a patch (see chain_patches)
+#  * VERSION.json: its 'data' is set to the new data version, so that l.update()
+#    offers it
+#
+#   python etc/bundle-data.py [--check] [--force] [--measure] [--root DIRECTORY]
+#
+# The build is incremental: problems that are unchanged since the current DATA2.txt
+# are copied from it rather than compressed again, and if nothing has changed
+# nothing is written. With --check the data is only validated. With --measure the
+# reference time of each problem with an AutoJudge reference solution is printed,
+# for its 'time_limit' (see Judge.limits). The project directory is the parent of
+# etc/ unless --root is given.
+
 import sys
 import os
 import yaml
+import gzip
 import json
 import base64
+import hashlib
+import argparse
 from pathlib import Path
 
 PRIVATE_DATA_FILENAME = 'etc/datasets/private.yaml'
+DATASETS_DIRECTORY = 'etc/datasets'
+LARGE_TESTS_DIRECTORY = 'tests'
 DATA_TXT_FILENAME = 'DATA.txt'
-
-if Path(os.getcwd()).name != 'learninformatics':
-    print('ERROR: run etc/bundle-data.py from project root directory', file=sys.stderr)
-    exit()
-
-# This script has one purpose: read the YAML file containing all test data
-# and produce nicely formatted Base64 data for inclusion in the public
-# Python file.
+PACKED_FILENAME = 'DATA2.txt'
+PATCHES_DIRECTORY = 'patches'
+VERSION_FILENAME = 'VERSION.json'
 
 def load_private_data():
     """Reads the YAML private data and returns a dictionary."""
     raw    = Path(PRIVATE_DATA_FILENAME).read_text()
-    cooked = yaml.safe_load(raw)
-    return cooked
+    return yaml.safe_load(raw)
+
+# --------------------------------------------------------------------------- #
+
+def validate(data):
+    """Returns (errors, warnings): lists of messages about the private data.
+       The data can't be published if there are errors."""
+    errors, warnings = [], []
+    meta = data.get('meta')
+    if not isinstance(meta, dict) or not isinstance(meta.get('data_version'), str):
+        errors.append("meta: needs a 'data_version' (a string like '2.6.5')")
+    if not isinstance(meta, dict) or not isinstance(meta.get('mapping'), dict):
+        errors.append("meta: needs a 'mapping' from exercise number to codename")
+        return errors, warnings
+    for number, codename in meta['mapping'].items():
+        if not (isinstance(number, str) and len(number) == 3 and number.isdigit()):
+            errors.append(f"meta: exercise number {number!r} is not three digits "
+                          f"in quotes")
+        if codename not in data or codename == 'meta':
+            errors.append(f"meta: exercise {number} is mapped to '{codename}', "
+                          f"which doesn't exist")
+    mapped = set(meta['mapping'].values())
+    ids = dict()
+    for codename, problem in data.items():
+        if codename == 'meta':
+            continue
+        if not isinstance(problem, dict):
+            errors.append(f'{codename}: is not a dictionary')
+            continue
+        errors.extend(f'{codename}: {message}' for message in validate_problem(problem))
+        if problem.get('id') in ids:
+            errors.append(f"{codename}: has the same id as {ids[problem['id']]}")
+        ids[problem.get('id')] = codename
+        if codename not in mapped:
+            warnings.append(f'{codename}: has no exercise number, so it is not used')
+    return errors, warnings
+
+def validate_problem(problem):
+    """Yields a message for each thing wrong with one problem's data."""
+    for key in ['name', 'id', 'newline']:
+        if not isinstance(problem.get(key), str) or problem[key] == '':
+            yield f"needs a '{key}'"
+    for key in ['samples', 'judge', 'large']:
+        if key not in problem:
+            if key != 'large':
+                yield f"needs '{key}'"
+            continue
+        values = problem[key]
+        if not isinstance(values, list) or len(values) % 2 != 0:
+            yield f"'{key}' must be a list [in, out, in, out, ...] of even length"
+            continue
+        for i, value in enumerate(values):
+            if not isinstance(value, str):
+                yield f"'{key}' item {i+1} ({value!r}) must be a string; quote it"
+        if key == 'large':
+            for name in values[0::2]:
+                if not (Path(DATASETS_DIRECTORY) / name).is_file():
+                    yield f"large test input {DATASETS_DIRECTORY}/{name} doesn't exist"
+    if problem.get('compare', 'exact') not in li.OutputChecker.RULES:
+        yield f"'compare' must be one of {li.OutputChecker.RULES}"
+    if 'auto' in problem:
+        auto = problem['auto']
+        generator = auto.get('generator') if isinstance(auto, dict) else None
+        if generator not in li.AutoJudge.VERSIONS:
+            yield f"'auto' needs a 'generator', one of {list(li.AutoJudge.VERSIONS)}"
+        elif not isinstance(auto.get('count'), int) or auto['count'] < 1:
+            yield "'auto' needs a 'count' of at least 1"
+    if 'scale' in problem:
+        scale = problem['scale']
+        generator = scale.get('generator') if isinstance(scale, dict) else None
+        if not hasattr(li.Scaler, str(generator)):
+            yield "'scale' needs a 'generator' (a static method of Scaler)"
+        elif not isinstance(scale.get('max'), int) or scale['max'] < 2:
+            yield "'scale' needs a 'max' of at least 2"
+    if 'time_limit' in problem:
+        limit = problem['time_limit']
+        if not isinstance(limit, dict) or set(limit) != {'factor', 'reference'}:
+            yield "'time_limit' needs a 'factor' and a 'reference' (see --measure)"
+        elif not all(isinstance(value, (int, float)) and value > 0
+                     for value in limit.values()):
+            yield "'time_limit' needs a positive 'factor' and 'reference'"
+        elif limit['factor'] * limit['reference'] < li.MIN_TIME_LIMIT:
+            seconds = limit['factor'] * limit['reference']
+            yield (f"'time_limit' gives {seconds:.2g} seconds, "
+                   f"less than MIN_TIME_LIMIT; leave it out to have TIME_LIMIT")
+
+# --------------------------------------------------------------------------- #
+
+def bundle_large_tests(large):
+    """In the YAML a problem's 'large' tests are a list [in, out, in, out, ...] like
+       'judge', except that each 'in' is the name of a file in etc/datasets holding
+       the input exactly as the program should read it.
+       Each input is compressed into tests/NAME.gz (which is published alongside
+       DATA2.txt) and the list is replaced by the descriptions the code expects:
+           {"file": "NAME.gz", "sha1": ..., "size": ..., "out": out}"""
+    Path(LARGE_TESTS_DIRECTORY).mkdir(exist_ok=True)
+    result = []
+    for i in range(0, len(large), 2):
+        source = Path(DATASETS_DIRECTORY) / large[i]
+        text = source.read_text()
+        target = Path(LARGE_TESTS_DIRECTORY) / (source.name + '.gz')
+        compressed = gzip.compress(text.encode('utf-8'), mtime=0)
+        if not target.is_file() or target.read_bytes() != compressed:
+            target.write_bytes(compressed)
+        result.append({'file': target.name,
+                       'sha1': hashlib.sha1(compressed).hexdigest(),
+                       'size': len(text),
+                       'out': large[i+1]})
+    return result
+
+def load_current_data():
+    """Reads the existing DATA2.txt (the previous release), or DATA.txt if there
+       isn't one, and returns it as a Container, or a dictionary if it is in the
+       older format, or None if there is neither."""
+    p = Path(PACKED_FILENAME)
+    if not p.is_file():
+        p = Path(DATA_TXT_FILENAME)
+    if not p.is_file():
+        return None
+    x = base64.decodebytes(p.read_bytes())
+    if x.startswith(li.Container.MAGIC):
+        return li.Container(x)
+    return json.loads(x)
 
-def base64encode_private_data():
-    """Load the private data (dictionary), convert to compact JSON, write it to DATA.txt
-       in the root directory."""
+def encode_legacy_data(dictionary):
+    """The contents of DATA.txt as software before version 2.4 reads it: the
+       whole dictionary as JSON, base64-encoded."""
+    return base64.encodebytes(json.dumps(dictionary).encode('ascii'))
+
+def changed_problems(old, new):
+    """The codenames of the problems in _new_ that differ from those in _old_."""
+    if not isinstance(old, li.Container):
+        return [c for c in new if c != 'meta' and (old is None or old.get(c) != new[c])]
+    return [c for c in new if c != 'meta' and
+            old.index.get(c, {}).get('sha1') != li.Container.problem_json(new[c])[0]]
+
+def write_patch(old, new):
+    """Write patches/OLD-NEW.json, containing only the problems that changed between
+       the two data versions, so that l.update() need not download all of DATA2.txt.
+       Nothing is written unless the version has gone up."""
+    if old is None or not li.Impl.lower_version(old['meta']['data_version'],
+                                                new['meta']['data_version']):
+        return
+    problems = {codename: new[codename] for codename in changed_problems(old, new)}
+    for codename in old:
+        if codename != 'meta' and codename not in new:
+            problems[codename] = None
+    patch = {'from': old['meta']['data_version'], 'to': new['meta']['data_version'],
+             'meta': new['meta'], 'problems': problems}
+    Path(PATCHES_DIRECTORY).mkdir(exist_ok=True)
+    path = Path(PATCHES_DIRECTORY) / f"{patch['from']}-{patch['to']}.json"
+    path.write_text(json.dumps(patch, separators=(',', ':')))
+    print(f'Wrote {path} ({len(problems)} problems changed)')
+
+def chain_patches(version):
+    """Writes a patch to _version_ from every earlier version that has one to a
+       later version, by joining patches end to end, so that l.update() can
+       patch data that is several versions behind in one step. A patch that
+       exists already is left alone."""
+    patches = dict()     # (from, to) -> patch
+    for path in Path(PATCHES_DIRECTORY).glob('*.json'):
+        patch = json.loads(path.read_text())
+        patches[(patch['from'], patch['to'])] = patch
+    added = True
+    while added:
+        added = False
+        for (first, middle), patch in list(patches.items()):
+            rest = patches.get((middle, version))
+            if middle == version or rest is None or (first, version) in patches:
+                continue
+            joined = {'from': first, 'to': version, 'meta': rest['meta'],
+                      'problems': dict(patch['problems'], **rest['problems'])}
+            patches[(first, version)] = joined
+            path = Path(PATCHES_DIRECTORY) / f'{first}-{version}.json'
+            path.write_text(json.dumps(joined, separators=(',', ':')))
+            print(f"Wrote {path} ({len(joined['problems'])} problems changed)")
+            added = True
+
+def write_version(version):
+    """Sets the 'data' of VERSION.json to _version_, if it isn't already."""
+    p = Path(VERSION_FILENAME)
+    versions = json.loads(p.read_text())
+    if versions.get('data') != version:
+        versions['data'] = version
+        p.write_text(json.dumps(versions, indent=2) + '\n')
+        print(f'Wrote {VERSION_FILENAME} (data version {version})')
+
+def build(force):
+    """Validates the private data and, unless it is unchanged, writes DATA2.txt,
+       DATA.txt and the patches. VERSION.json is brought up to date either way.
+       Returns the exit status."""
     dictionary = load_private_data()
-    x = json.dumps(dictionary)
-    x = x.encode("ascii")
-    x = base64.encodebytes(x)
-    x = x.decode("ascii")
-    Path(DATA_TXT_FILENAME).write_text(x)
+    if not report_validation(dictionary):
+        return 1
+    for problem in dictionary.values():
+        if 'large' in problem:
+            problem['large'] = bundle_large_tests(problem['large'])
+    previous = load_current_data()
+    changed = changed_problems(previous, dictionary)
+    legacy = encode_legacy_data(dictionary)
+    unchanged = (isinstance(previous, li.Container) and not changed
+                 and list(previous) == list(dictionary)
+                 and previous['meta'] == dictionary['meta']
+                 and Path(DATA_TXT_FILENAME).is_file()
+                 and Path(DATA_TXT_FILENAME).read_bytes() == legacy)
+    version = dictionary['meta']['data_version']
+    if unchanged and not force:
+        print(f'{PACKED_FILENAME} and {DATA_TXT_FILENAME} are up to date')
+        chain_patches(version)
+        write_version(version)
+        return 0
+    if changed and previous is not None and \
+            previous['meta']['data_version'] == dictionary['meta']['data_version']:
+        print(f"WARNING: {len(changed)} problems changed but data_version is still "
+              f"{dictionary['meta']['data_version']}, so l.update() won't fetch them",
+              file=sys.stderr)
+    reuse = previous if isinstance(previous, li.Container) and not force else None
+    p = Path(PACKED_FILENAME)
+    old_size = p.stat().st_size if p.is_file() else 0
+    p.write_bytes(li.Updater.encode_data(dictionary, reuse))
+    print(f'Wrote {PACKED_FILENAME} ({len(changed)} of {len(dictionary) - 1} problems '
+          f'changed; {old_size} -> {p.stat().st_size} bytes)')
+    Path(DATA_TXT_FILENAME).write_bytes(legacy)
+    print(f'Wrote {DATA_TXT_FILENAME} for software before 2.4')
+    write_patch(previous, dictionary)
+    chain_patches(version)
+    write_version(version)
+    return 0
+
+def measure(dictionary):
+    """Prints, for each problem with an AutoJudge reference solution, the time
+       it takes on the slowest case, as it would be on the reference computer
+       (see Calibration): the 'reference' of its 'time_limit'."""
+    factor = li.Calibration.calibrate()
+    print(f'Speed factor of this computer: {factor}')
+    for codename, problem in dictionary.items():
+        if codename == 'meta' or 'auto' not in problem:
+            continue
+        reference = getattr(li.AutoJudge, problem['auto']['generator'] + '_reference')
+        pairs = []
+        for dataset in ['samples', 'judge']:
+            cases = li.Judge.input_output_pairs(problem[dataset], problem['newline'])
+            pairs.extend(cases)
+        pairs.extend(li.Judge.auto_pairs(problem))
+        slowest = 0.0
+        for datain, _ in pairs:
+            seconds = min(li.Sandbox.execute(reference, datain)[2]['wall']
+                          for _ in range(li.SCALE_REPEATS))
+            slowest = max(slowest, seconds)
+        print(f'{codename}: reference {slowest / factor:.2g}')
+
+def report_validation(dictionary):
+    """Prints the validation messages; returns True if there are no errors."""
+    errors, warnings = validate(dictionary)
+    for message in warnings:
+        print(f'WARNING: {message}', file=sys.stderr)
+    for message in errors:
+        print(f'ERROR: {message}', file=sys.stderr)
+    return not errors
+
+
+parser = argparse.ArgumentParser(
+    description='Build DATA2.txt and DATA.txt from the private data.')
+parser.add_argument('--check', action='store_true', help='only validate the private data')
+parser.add_argument('--force', action='store_true', help='rebuild every problem')
+parser.add_argument('--measure', action='store_true',
+                    help='print the reference time of problems with a reference solution')
+parser.add_argument('--root', default=Path(__file__).resolve().parent.parent,
+                    help='project directory (default: the parent of etc/)')
+args = parser.parse_args()
 
+os.chdir(args.root)
+sys.path.insert(0, os.getcwd())
+import learninformatics as li
 
-base64encode_private_data()
+if args.check:
+    exit(0 if report_validation(load_private_data()) else 1)
+if args.measure:
+    exit(measure(load_private_data()))
+exit(build(args.force))
@@ -0,0 +1,170 @@
+# This script grades a whole class offline: every .py file in a directory is one
+# student's submission, and every function exNNN it defines (for an exercise in the
+# data) is judged on every case, as l.judge would. One JSON line is written per file:
+#
+#   {"student": "alice", "file": "alice.py", "seconds": 1.9, "timed_out": false,
+#    "tokens": ["301-1c23ea", ...], "exercises": [{"number": "301", "status": "AC",
+#    "token": "301-1c23ea", "cases": [...], ...}, ...]}
+#
+#   python etc/grade.py DIRECTORY [--output FILE] [--workers N] [--timeout SECONDS]
+#
+# The files are only compiled and run in Sandbox workers (see Submission), spread
+# across all cores; no file is imported here. A file that runs for more than
+# --timeout seconds in all has its remaining cases skipped and counts as TLE.
+# Reasons for failures are only given for samples, as judging data is secret.
+# A summary goes to standard error.
+#
+# Each file is loaded afresh in a newly forked worker, so nothing one file changes
+# (a module it patches, a global it sets) is seen by the next. The workers run in
+# an empty temporary directory, and a submission's OUT never holds the expected
+# output. That is not real isolation (see Sandbox): grade files that can't be
+# trusted as an unprivileged user, in a container.
+
+import os
+import re
+import sys
+import ast
+import json
+import time
+import argparse
+import tempfile
+from collections import deque
+from pathlib import Path
+
+PROJECT_DIRECTORY = Path(__file__).resolve().parent.parent
+DEFAULT_TIMEOUT = 60      # seconds of running time allowed for one file
+EXERCISE_FUNCTION = re.compile(r'ex(\d+)$')
+
+cases = dict()            # exercise number -> [(dataset, datain, expected)]
+
+def exercise_cases(data, number):
+    """The cases of the exercise, read (and if need be downloaded) once."""
+    if number not in cases:
+        cases[number] = list(li.Admin.all_cases(data, number))
+    return cases[number]
+
+def defined_exercises(source, filename, numbers):
+    """The exercise numbers (among _numbers_) of the top-level exNNN functions
+       defined by the source, found without running it."""
+    tree = ast.parse(source, filename)
+    found = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            match = EXERCISE_FUNCTION.match(node.name)
+            if match and match.group(1) in numbers and match.group(1) not in found:
+                found.append(match.group(1))
+    return found
+
+def new_record(data, path, numbers):
+    """The record for one file, with a report entry (see Admin.report_entry) for
+       each exercise it defines. 'remaining' counts the cases still to come."""
+    record = {'student': path.stem, 'file': path.name, 'seconds': 0.0, 'timed_out': False,
+              'tokens': [], 'exercises': [], 'remaining': 0}
+    try:
+        source = path.read_text(encoding='utf-8')
+        found = defined_exercises(source, str(path), numbers)
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as exc:
+        record['error'] = f'{type(exc).__name__}: {exc}'
+        return record, None
+    for number in found:
+        entry = li.Admin.report_entry(number, data.problem_data(number), data.version())
+        entry['token'] = None
+        record['exercises'].append(entry)
+    return record, source
+
+# --------------------------------------------------------------------------- #
+
+def jobs(data, paths, records, owners, timeout):
+    """Yields the Sandbox jobs for every case of every file, one file after
+       another. Each file's record is appended to _records_ before its jobs, and
+       the owner of each job to _owners_, so that outcomes can be matched up.
+       Jobs of a file that has used up its _timeout_ are left out."""
+    numbers = set(data.exercise_numbers())
+    for path in paths:
+        record, source = new_record(data, path, numbers)
+        records.append(record)
+        for entry in record['exercises']:
+            submission = li.Submission(source, entry['number'], record['file'])
+            comparison = li.Judge.comparison(data.problem_data(entry['number']))
+            limits = li.Judge.limits(data.problem_data(entry['number']))
+            for dataset, datain, expected in exercise_cases(data, entry['number']):
+                if record['seconds'] > timeout:
+                    record['timed_out'] = True
+                    break
+                record['remaining'] += 1
+                owners.append((record, entry, dataset, datain, expected))
+                checker = li.OutputChecker(expected, **comparison)
+                yield (submission, datain, checker, limits)
+
+def finish(record):
+    """Awards tokens and tidies the record for output."""
+    for entry in record['exercises']:
+        if record['timed_out'] and entry['status'] == 'AC' and \
+                len(entry['cases']) < len(cases[entry['number']]):
+            entry['status'] = 'TLE'
+        if entry['status'] == 'AC':
+            entry['token'] = li.Impl.token(entry['number'], entry['id'])
+            record['tokens'].append(entry['token'])
+    record['seconds'] = round(record['seconds'], 6)
+    del record['remaining']
+    return record
+
+def grade(directory, out, workers, timeout):
+    data = li.Interface.ensure_data()
+    paths = sorted(path for path in Path(directory).glob('*.py') if path.is_file())
+    records, owners = deque(), deque()
+    n_files, n_exercises, n_ac = 0, 0, 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='grade-') as scratch, \
+            li.Sandbox(dict(), size=workers, directory=scratch) as sandbox:
+        outcomes = sandbox.imap_jobs(jobs(data, paths, records, owners, timeout))
+        while True:
+            outcome = next(outcomes, None)
+            if outcome is not None:
+                status, dataout, metrics = outcome
+                record, entry, dataset, datain, expected = owners.popleft()
+                samples = (dataset == 'samples')
+                result = li.Judge.verdict(status, (datain, expected), dataout, metrics,
+                                          samples)
+                li.Admin.add_case(entry, dataset, result, reasons=samples)
+                record['seconds'] += metrics['wall']
+                record['remaining'] -= 1
+            # A record is complete once its cases are done and the next file's
+            # record has been made (or there are no more files).
+            while records and records[0]['remaining'] == 0 and \
+                    (len(records) > 1 or outcome is None):
+                record = finish(records.popleft())
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                n_files += 1
+                n_exercises += len(record['exercises'])
+                n_ac += len(record['tokens'])
+            if outcome is None:
+                break
+    elapsed = time.perf_counter() - start
+    print(f'{n_files} files, {n_exercises} exercises judged, {n_ac} AC, '
+          f'in {elapsed:.1f} seconds', file=sys.stderr)
+
+
+parser = argparse.ArgumentParser(description='Judge a directory of student submissions.')
+parser.add_argument('directory')
+parser.add_argument('--output', help='JSONL file to write (default: standard output)')
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                    help='seconds of running time allowed for each file')
+args = parser.parse_args()
+
+directory = os.path.abspath(args.directory)
+output = args.output and os.path.abspath(args.output)
+os.chdir(PROJECT_DIRECTORY)
+sys.path.insert(0, str(PROJECT_DIRECTORY))
+import learninformatics as li
+
+if not li.Sandbox.is_supported():
+    print("ERROR: grading needs the 'fork' start method (Linux)", file=sys.stderr)
+    exit(1)
+if output:
+    with open(output, 'w') as out:
+        grade(directory, out, args.workers, args.timeout)
+else:
+    grade(directory, sys.stdout, args.workers, args.timeout)
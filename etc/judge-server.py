@@ -0,0 +1,262 @@
+# A local judging server, so that the submissions of a whole class (e.g. for the
+# Informatics Leaderboard) can be judged on one Linux machine, without Internet
+# access, instead of in each student's replit.
+#
+#   python etc/judge-server.py [--host HOST] [--port PORT] [--workers N] [--queue N]
+#
+# Submit:  POST /submissions  with JSON
+#          {"number": 107, "source": "def ex107(IN, OUT): ..."}
+#          -> 202 {"submission": ID, "state": "queued", ...}
+#          -> 503 if the queue is full: try again after Retry-After seconds
+# Result:  GET /submissions/ID            (add ?wait=SECONDS to wait until judged)
+#          -> {"submission": ID, "state": "queued" | "running" | "done",
+#              "status": "AC" | "WA" | ..., "token": ... (when AC), "cases": [...]}
+# Status:  GET /status
+#
+# Submissions are judged on every case (samples, judging data, large and generated
+# tests) by one pool of Sandbox workers; the source is only ever run there. Once a
+# case exceeds the time limit, the submission's remaining cases are skipped. Results
+# never include judging data: the reason for a failure is only given for samples.
+#
+# The workers run in an empty temporary directory, each submission is run in a
+# freshly forked worker (so one submission can't change the modules or functions
+# another one uses), and a submission's OUT never holds the expected output (it is
+# checked by the server). That is not real isolation: a worker runs as the same
+# user as the server, so a determined submission can still read the server's files
+# and memory (see Sandbox). Run the server as an unprivileged user, in a container
+# that holds nothing but this project, when the submissions can't be trusted.
+
+import os
+import sys
+import json
+import queue
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from pathlib import Path
+
+PROJECT_DIRECTORY = Path(__file__).resolve().parent.parent
+DEFAULT_PORT = 8000
+DEFAULT_QUEUE = 1000      # submissions waiting to be judged before 503 is returned
+BATCH_SIZE = 32           # submissions whose cases are handed to the workers together
+RESULTS_KEPT = 10_000     # judged submissions remembered for GET
+SOURCE_LIMIT = 100_000    # characters allowed in a submission
+MAX_WAIT = 60             # seconds a GET may wait for a result
+RETRY_AFTER = 5           # seconds, suggested to clients when the queue is full
+TOO_LONG = {'error': f'source is limited to {SOURCE_LIMIT} characters'}
+
+os.chdir(PROJECT_DIRECTORY)
+sys.path.insert(0, str(PROJECT_DIRECTORY))
+import learninformatics as li
+
+lock = threading.Lock()
+submissions = OrderedDict()     # id -> record (see new_record)
+pending = None                  # queue.Queue of records, set in main
+cases = dict()                  # exercise number -> [(dataset, datain, expected)]
+
+def load_cases(data):
+    """Reads (and if need be downloads or generates) every case of every exercise
+       once, before serving, so that judging needs no network and no decoding."""
+    for number in data.exercise_numbers():
+        cases[number] = list(li.Admin.all_cases(data, number))
+    total = sum(len(c) for c in cases.values())
+    print(f'Loaded {total} cases for {len(cases)} exercises')
+
+def new_record(number, source):
+    data = li.Interface.data
+    with lock:
+        n = next(reversed(submissions), 0) + 1
+        record = {'submission': n, 'state': 'queued', 'source': source,
+                  'report': li.Admin.report_entry(number, data.problem_data(number),
+                                                  data.version()),
+                  'token': None, 'done': threading.Event()}
+        submissions[n] = record
+        while len(submissions) > RESULTS_KEPT:
+            oldest = next(iter(submissions.values()))
+            if oldest['state'] != 'done':
+                break
+            submissions.popitem(last=False)
+    return record
+
+def public(record):
+    """The JSON-able view of a record, as returned to clients."""
+    with lock:
+        result = {'submission': record['submission'], 'state': record['state']}
+        result.update(json.loads(json.dumps(record['report'])))
+        result['token'] = record['token']
+    if result['state'] == 'queued':
+        result['queued'] = pending.qsize()
+    return result
+
+# --------------------------------------------------------------------------- #
+
+def dispatch(sandbox):
+    """The judging loop: takes up to BATCH_SIZE queued submissions at a time and
+       runs all their cases on the sandbox's workers."""
+    while True:
+        batch = [pending.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(pending.get_nowait())
+            except queue.Empty:
+                break
+        judge_batch(sandbox, batch)
+
+def judge_batch(sandbox, batch):
+    """Judges the submissions of a batch. Jobs are made as the workers become
+       free, so that the cases of a submission that has had a TLE are skipped
+       rather than run."""
+    owners = deque()     # (record, dataset, datain, expected, whether run) per case
+    timed_out = set()    # submission numbers with a case that exceeded the time limit
+    with lock:
+        for record in batch:
+            record['state'] = 'running'
+    for status, dataout, metrics in sandbox.imap_jobs(jobs(batch, owners, timed_out)):
+        while not owners[0][4]:
+            add_case(owners.popleft(), li.Admin.SKIPPED)
+        record = owners[0][0]
+        if status == 'TLE':
+            timed_out.add(record['submission'])
+        add_case(owners.popleft(), (status, dataout, metrics))
+    while owners:
+        add_case(owners.popleft(), li.Admin.SKIPPED)
+
+def jobs(batch, owners, timed_out):
+    """Yields the Sandbox jobs for the cases of the _batch_, appending the owner
+       of every case to _owners_, including the cases left out because their
+       submission is in _timed_out_."""
+    data = li.Interface.data
+    for record in batch:
+        number = record['report']['number']
+        submission = li.Submission(record['source'], number,
+                                   f"submission {record['submission']}")
+        comparison = li.Judge.comparison(data.problem_data(number))
+        limits = li.Judge.limits(data.problem_data(number))
+        for dataset, datain, expected in cases[number]:
+            run = record['submission'] not in timed_out
+            owners.append((record, dataset, datain, expected, run))
+            if run:
+                checker = li.OutputChecker(expected, **comparison)
+                yield (submission, datain, checker, limits)
+
+def add_case(owner, outcome):
+    record, dataset, datain, expected, _ = owner
+    status, dataout, metrics = outcome
+    report = record['report']
+    with lock:
+        samples = (dataset == 'samples')
+        li.Admin.add_case(report, dataset, li.Judge.verdict(status, (datain, expected),
+                                                            dataout, metrics, samples),
+                          reasons=samples)
+    if len(report['cases']) == len(cases[report['number']]):
+        finish(record)
+
+def finish(record):
+    report = record['report']
+    with lock:
+        if report['status'] == 'AC':
+            record['token'] = li.Impl.token(report['number'], report['id'])
+        record['state'] = 'done'
+        del record['source']
+    record['done'].set()
+
+# --------------------------------------------------------------------------- #
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(s):
+        if urlparse(s.path).path != '/submissions':
+            return s.reply(404, {'error': 'not found'})
+        try:
+            length = int(s.headers.get('Content-Length', 0))
+            if length > 4 * SOURCE_LIMIT:
+                return s.reply(413, TOO_LONG)
+            body = json.loads(s.rfile.read(length))
+            number, source = str(body['number']), body['source']
+        except (ValueError, KeyError, TypeError):
+            return s.reply(400, {'error': 'expected JSON {"number": ..., "source": ...}'})
+        if number not in cases:
+            return s.reply(400, {'error': f'no exercise {number}'})
+        if not isinstance(source, str) or len(source) > SOURCE_LIMIT:
+            return s.reply(413, TOO_LONG)
+        record = new_record(number, source)
+        try:
+            pending.put_nowait(record)
+        except queue.Full:
+            with lock:
+                del submissions[record['submission']]
+            return s.reply(503, {'error': 'too many submissions waiting; try again soon'},
+                           {'Retry-After': str(RETRY_AFTER)})
+        s.reply(202, public(record))
+
+    def do_GET(s):
+        url = urlparse(s.path)
+        parts = url.path.strip('/').split('/')
+        if parts == ['status']:
+            with lock:
+                states = [record['state'] for record in submissions.values()]
+            return s.reply(200, {'queued': pending.qsize(), 'maxsize': pending.maxsize,
+                                 'running': states.count('running'),
+                                 'done': states.count('done'),
+                                 'workers': len(sandbox.workers)})
+        if len(parts) != 2 or parts[0] != 'submissions' or not parts[1].isdigit():
+            return s.reply(404, {'error': 'not found'})
+        with lock:
+            record = submissions.get(int(parts[1]))
+        if record is None:
+            return s.reply(404, {'error': 'no such submission'})
+        try:
+            wait = float(parse_qs(url.query).get('wait', ['0'])[0])
+        except ValueError:
+            wait = 0
+        if wait > 0:
+            record['done'].wait(min(wait, MAX_WAIT))
+        s.reply(200, public(record))
+
+    def reply(s, code, body, headers=dict()):
+        content = json.dumps(body).encode('utf-8')
+        s.send_response(code)
+        s.send_header('Content-Type', 'application/json')
+        s.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            s.send_header(name, value)
+        s.end_headers()
+        s.wfile.write(content)
+
+    def log_message(s, format, *args):
+        pass
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 1024    # many students may submit at the same moment
+    daemon_threads = True
+
+# --------------------------------------------------------------------------- #
+
+parser = argparse.ArgumentParser(description='Judge exercise submissions over HTTP.')
+parser.add_argument('--host', default='127.0.0.1')
+parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE)
+args = parser.parse_args()
+
+if not li.Sandbox.is_supported():
+    print("ERROR: the judging server needs the 'fork' start method (Linux)",
+          file=sys.stderr)
+    exit(1)
+load_cases(li.Interface.ensure_data())
+pending = queue.Queue(maxsize=args.queue)
+scratch = tempfile.TemporaryDirectory(prefix='judge-server-')
+sandbox = li.Sandbox(dict(), size=args.workers, directory=scratch.name)
+threading.Thread(target=dispatch, args=(sandbox,), daemon=True).start()
+server = Server((args.host, args.port), Handler)
+print(f'Judging on http://{args.host}:{args.port}/ with {args.workers} workers')
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
+    sandbox.close()
+    scratch.cleanup()
@@ -0,0 +1,46 @@
+# This script checks tokens (as awarded by l.judge) in bulk, for the Informatics
+# Leaderboard. Tokens are read from the given files, or standard input, separated
+# by any whitespace, and one JSON line is written per token:
+#
+#   {"token": "301-1c23ea", "valid": true, "number": "301", "id": "p025", "name": "..."}
+#   {"token": "301-000000", "valid": false, "reason": "..."}
+#
+#   python etc/verify-tokens.py [FILE ...] > results.jsonl
+#
+# A summary goes to standard error. The token index is built from the current
+# data once per data version (see TokenIndex).
+
+import os
+import sys
+import json
+from pathlib import Path
+
+PROJECT_DIRECTORY = Path(__file__).resolve().parent.parent
+
+def words(files):
+    """Yields each whitespace-separated word of the files ('-' is standard input)."""
+    for name in files:
+        f = sys.stdin if name == '-' else open(name)
+        with f:
+            for line in f:
+                yield from line.split()
+
+def verify(files):
+    index = li.TokenIndex.load(li.Interface.ensure_data())
+    n_valid, n_invalid = 0, 0
+    out = sys.stdout
+    for result in li.TokenIndex.verify(words(files), index):
+        out.write(json.dumps(result) + '\n')
+        if result['valid']:
+            n_valid += 1
+        else:
+            n_invalid += 1
+    out.flush()
+    print(f'{n_valid} valid, {n_invalid} invalid', file=sys.stderr)
+
+
+files = [os.path.abspath(name) if name != '-' else name for name in sys.argv[1:]] or ['-']
+os.chdir(PROJECT_DIRECTORY)
+sys.path.insert(0, str(PROJECT_DIRECTORY))
+import learninformatics as li
+verify(files)
@@ -1,35 +1,84 @@
+import os
 import sys
+import gzip
 import json
+import math
+import mmap
+import re
+import time
+import zlib
 import base64
-import hashlib
-import shutil
-from io import StringIO
-from random import randint
-from multiprocessing import Process
+import signal
+from io import StringIO, TextIOBase, RawIOBase, BufferedReader, TextIOWrapper
+from itertools import chain, count
+from collections import OrderedDict
+from collections.abc import Mapping
+from random import randint, Random
 from pathlib import Path
-import urllib.request
+from types import CodeType, FunctionType, ModuleType
+
+# Importing this module does nothing but define things, and it only imports what
+# is quick to import: the data is loaded when first needed (Interface.ensure_data),
+# and the slower modules (urllib.request, multiprocessing, hashlib, ast) are
+# imported by the functions that use them.
 
 # Coming improvements:
-#  * handle large tests in separate file [maybe not - perhaps separately in same
-#    yaml/json file]
-#  * use Process to enable timeout enforcement [no hurry for this]
 #  * improve printing of error and info messages (too many blank lines)
 
 # --------------------------------------------------------------------------- #
 
-SOFTWARE_VERSION = "2.3"
-VERS_URL = 'https://raw.githubusercontent.com/gsinclair/learninformatics/master/VERSION.json'
-DATA_URL = 'https://raw.githubusercontent.com/gsinclair/learninformatics/master/DATA.txt'
-CODE_URL = 'https://raw.githubusercontent.com/gsinclair/learninformatics/master/learninformatics.py'
+SOFTWARE_VERSION = "2.4"
+BANNER_VARIABLE = 'LEARNINFORMATICS_BANNER'    # set it to print the banner on import
+BASE_URL = os.environ.get('LEARNINFORMATICS_URL',
+                          'https://raw.githubusercontent.com/gsinclair/learninformatics/master')
+VERS_URL = BASE_URL + '/VERSION.json'
+DATA_URL = BASE_URL + '/DATA.txt'               # for software before 2.4
+PACKED_URL = BASE_URL + '/DATA2.txt'
+CODE_URL = BASE_URL + '/learninformatics.py'
+PATCH_URL = BASE_URL + '/patches/{}-{}.json'     # old and new data versions
+LARGE_TESTS_URL = BASE_URL + '/tests/{}'
 BOOK_URL = 'bit.ly/hsifcb'
 DATA_FILENAME = 'DATA.txt'
+PACKED_FILENAME = 'DATA2.txt'
+CONTAINER_FILENAME = 'DATA.bin'
 CODE_FILENAME = 'learninformatics.py'
+LARGE_TESTS_DIRECTORY = 'tests'
+CACHE_DIRECTORY = '.learninformatics-cache'
+UPDATE_STATE_FILENAME = '.learninformatics-update.json'
+VERSION_TTL = 600         # seconds for which VERSION.json is not fetched again
 
 DEBUG_LEARNINFORMATICS = False
 
+TIME_LIMIT = 2.0          # wall-clock seconds allowed for each test case
+CPU_TIME_LIMIT = 2.0      # CPU seconds allowed for each test case
+MIN_TIME_LIMIT = 1.0      # seconds; the least a problem's 'time_limit' can give
+CALIBRATION_LOOPS = 100_000 # size of Calibration.workload
+CALIBRATION_SECONDS = 0.03  # time Calibration.workload takes on the reference computer
+CALIBRATION_RUNS = 5      # timed runs of Calibration.workload per measurement
+CALIBRATION_KEPT = 7      # measurements kept; the speed factor is their median
+CALIBRATION_INTERVAL = 3600 # seconds after which a new session measures again
+SPEED_FACTOR_RANGE = (0.5, 4.0) # limits to the speed factor measured (see Calibration)
+MEMORY_LIMIT = 256        # megabytes of memory allowed for each test case
+SANDBOX_WORKERS = 1       # worker processes used when not judging in parallel
+OUTPUT_LIMIT = 10_000_000 # characters of output allowed for each test case
+OUTPUT_KEPT = 10_000      # characters of output kept to show the user
+FLOAT_TOLERANCE = 1e-6    # for problems whose output is compared as numbers
+RESULT_CACHE_SIZE = 32    # results of l.test and l.judge remembered (see ResultCache)
+MINIMISE_BUDGET = 3.0     # seconds spent looking for a small failing input (Minimiser)
+MINIMISE_SMALL = 100      # every size up to this is tried by the Minimiser
+MINIMISE_ROUNDS = 20      # rounds of fresh inputs tried by the Minimiser
+SCALE_STEPS = 10          # input sizes tried by l.scale, doubling up to the judge's
+SCALE_REPEATS = 3         # runs at each size (the fastest is kept)
+SCALE_RUN_LIMIT = 0.5     # seconds; l.scale tries no bigger input after a run this slow
+SCALE_NOISE_FLOOR = 1e-4  # seconds; quicker runs are too noisy to fit a curve to
+PROFILE_TOP = 10          # functions (and lines) shown by l.profile
+PROFILE_TIME_FACTOR = 5   # l.profile allows this many times the time limit
+PROFILE_MANY_CALLS = 10_000 # calls of IN or OUT that l.profile warns about
+
 HELP = """
 Helpful commands:
  * l.help()              - you're reading it
+ * l.welcome()           - print the welcome message
  * l.info()              - print versions and exercise numbers
  * l.exercises()         - print exercise numbers and names
 
@@ -39,21 +88,57 @@ Completing exercises:
                            (probably just the sample(s) in the problem statement)
  * l.judge(107)          - run function 'ex107' with judging data and award
                            a token if all inputs give the correct output
+ * l.scale(107)          - time function 'ex107' on bigger and bigger inputs to
+                           see if it will be fast enough for l.judge
+                           (only for problems where speed matters)
+ * l.profile(107)        - find out where function 'ex107' spends its time, on
+                           the biggest input it can be given (not judging data)
 Result codes:
  * AC                    - all correct (the correct output was given)
  * WA                    - wrong answer (incorrect output was given)
  * RTE                   - run-time exception (the code crashed)
- * TLE                   - time limit exceeded (generally 2 seconds)
+ * TLE                   - time limit exceeded (generally 2 seconds, allowing for
+                           the speed of the computer)
+ * OLE                   - output limit exceeded (far too much output)
+ * MLE                   - memory limit exceeded (generally 256 MB)
+ * SKIP                  - not run, because an earlier test failed (fast=True)
+
+After l.test or l.judge, each test case shows its running time and memory use.
+l.report() gives these details (and the time used by the processor) as data.
 
 Advanced:
  * l.run(func)           - run any function you like (it must have IN and OUT)
  * l.run(107, '56\\n42\\n')      - run 'ex107' with the given data
  * l.run(func, '56\\n42\\n')     - run any function with the given data
+ * l.run(107, 'input.txt')     - run 'ex107' with the data in a file (also
+                                 a Path, a file opened with 'rb', or a
+                                 generator of lines), however big it is
+ * l.run(107, 'input.txt', out='output.txt') - write the output to a file
+ * l.run(107, 'input.txt', out=False)        - don't show the output, just
+                                               count it
+ * l.judge(107, parallel=True) - spread the test cases across all processor
+                                 cores (also works for l.test)
+ * l.judge(107, cache=False)   - run the tests again even if 'ex107' hasn't
+                                 changed since last time (also for l.test)
+ * l.judge(107, fast=True)     - run the quickest tests first and stop at the
+                                 first failure (also for l.test)
+ * l.test(107, minimise=True)  - if the samples pass, look for a small input
+                                 that fails, and show it (some problems only)
+ * l.profile(107, lines=True)  - also time each line of your code (slower)
+ * l.calibrate()               - measure again how fast this computer is (time
+                                 limits allow for it)
 
      (Providing data to l.run(...) could save time when you want to test
       something specific repeatedly.)
 """
 
+WELCOME = """
+=====================================================
+*    Welcome to the learninformatics environment    *
+*    Run l.help() to see available commands         *
+=====================================================
+"""
+
 # --------------------------------------------------------------------------- #
 
 def info():
@@ -69,6 +154,11 @@ def help():
     """Provides overview of all available commands."""
     print(HELP)
 
+def welcome():
+    """Prints the welcome message. This is done on import only if the environment
+       variable LEARNINFORMATICS_BANNER is set (to anything but 0)."""
+    print(WELCOME)
+
 def update():
     """Update data and code if needed by checking availability of newer versions."""
     Interface.update()
@@ -77,11 +167,16 @@ def force_update():
     """Force update of data and code; to be used if something is wrong."""
     Interface.force_update()
 
+def calibrate():
+    """Measure again how fast this computer runs Python, which time limits allow
+       for, e.g. if it was busy with something else when it was last measured."""
+    Interface.calibrate()
+
 def details_for_angeni():
     """Print (id :: number :: name) for each problem so that Angeni can tend her database."""
     Interface.details_for_angeni()
 
-def run(*args):
+def run(*args, out=None):
     """Run a function with optional data given.
 
        run(107)            -- runs function 'ex107' with keyboard and screen
@@ -89,37 +184,98 @@ def run(*args):
        run(mycode)         -- runs function 'mycode' with keyboard and screen
        run(mycode, '56\n') -- runs function 'mycode' with given input and screen
 
-       Note that 'given input' would often be several lines."""
-    Interface.run(*args)
+       Note that 'given input' would often be several lines.
+       The input can also be the name (or Path) of a file, a file opened with
+       open(name, 'rb'), or a generator (or list) of lines; it is read as the
+       function asks for it, so it can be as big as you like.
 
-def test(number):
-    """Run an exercise function with test data (the samples described in the problem
-       and possibly some more) and give informative report if there is failure.
+       run(107, 'big.txt', out='answer.txt') -- writes the output to a file
+       run(107, 'big.txt', out=False)        -- only counts the output
 
-       l.test(107)         -- tests exercise 107 (function 'ex107')"""
-    Interface.test(number)
+       When input is given, the time taken is shown afterwards."""
+    Interface.run(*args, out=out)
 
-def judge(number):
+def test(number, parallel=False, cache=True, fast=False, minimise=False):
+    """Run an exercise function with test data (the samples described in the problem
+       and possibly some more) and give informative report if there is failure.
+       If the function hasn't changed since it was last tested, the same results
+       are given again straight away, unless cache=False.
+
+       l.test(107)         -- tests exercise 107 (function 'ex107')
+       l.test(107, parallel=True)  -- same, running test cases on all cores
+       l.test(107, fast=True)      -- same, quickest cases first, stopping at
+                                      the first one that fails
+       l.test(107, minimise=True)  -- same, and if the samples pass, spend a
+                                      few seconds looking for a small input
+                                      that fails (for some problems)"""
+    Interface.test(number, parallel, cache, fast, minimise)
+
+def judge(number, parallel=False, cache=True, fast=False):
     """Run an exercise function with judging data which is kept secret in the event
        of a failure. Basic information provided (AC, WA, etc.).
-
-       l.judge(107)        -- judges exercise 107 (function 'ex107')"""
-    Interface.judge(number)
+       If the function hasn't changed since it was last judged, the same results
+       (and token) are given again straight away, unless cache=False.
+
+       l.judge(107)        -- judges exercise 107 (function 'ex107')
+       l.judge(107, parallel=4)    -- same, running four test cases at a time
+       l.judge(107, cache=False)   -- same, but run the tests again regardless
+       l.judge(107, fast=True)     -- same, quickest cases first, stopping at
+                                      the first one that fails (the rest are
+                                      shown as SKIP)"""
+    Interface.judge(number, parallel, cache, fast)
+
+def scale(number):
+    """Run an exercise function on inputs of increasing size, and from the times taken
+       estimate how long it will take on the largest judging input, so that you
+       know whether it is likely to exceed the time limit before you judge it.
+
+       l.scale(301)        -- times exercise 301 (function 'ex301')"""
+    Interface.scale(number)
+
+def profile(number, lines=False):
+    """Run an exercise function under a profiler, on the largest sample or (for
+       problems where speed matters) a generated input as big as the judge's
+       largest, and show the functions that take the most time and how many
+       times IN and OUT were used. With lines=True, the slowest lines of your
+       code are shown too.
+
+       l.profile(301)      -- profiles exercise 301 (function 'ex301')"""
+    Interface.profile(number, lines)
+
+def report():
+    """Return the details of the last l.test or l.judge: a dictionary with the
+       problem number and name, a count of each result code, and a list of
+       test cases with their result code, time taken (seconds, by the clock
+       and by the processor) and memory used (megabytes)."""
+    return Interface.last_report
 
 # --------------------------------------------------------------------------- #
 
 class LIData:
     """Handles the initialisation, interface and update for the learninformatics data
-    sets"""
+    sets.
+    DATA2.txt holds the data packed (see Container): each problem is compressed
+    and checksummed separately, and is only decoded, and checked, when it is
+    first asked for. DATA.bin is the same, unencoded, so it is used when it is
+    present and was built from the current DATA2.txt (same content hash and
+    data version); otherwise DATA2.txt is decoded and DATA.bin is rebuilt.
+    DATA.txt, in the older format (base64-encoded JSON), is still published for
+    older software, which can read nothing else. It is used (and DATA.bin is
+    built from it) until DATA2.txt is first downloaded or patched."""
     def __init__(s):
-        s.data = s._data_from_file()
+        s.case_store = dict()     # (number, dataset) -> CaseSet, see cases
+        s.data = s._data_from_container()
+        if s.data is None:
+            s.data = s._data_from_file()
+            if s.data is not None:
+                s._write_container()
         if s.data is None:
-            Impl.info("You have no data file, so I'll download it")
+            Impl.info("You have no usable data file, so I'll download it")
             s._force_update()
 
     def is_ok(s):
-        """Basic sanity check on our data"""
-        return type(s.data) == type(dict()) and len(s.data) > 0
+        """Basic sanity check on our data (see also problem_data)"""
+        return isinstance(s.data, (dict, Container)) and len(s.data) > 0
 
     def version(s):
         return s.data['meta']['data_version']
@@ -129,67 +285,366 @@ class LIData:
 
     def problem_id(s, number):
         codename =  s.data['meta']['mapping'][number]
-        return s.data[codename]['id']
+        return s._summary(codename)['id']
 
     def problem_name(s, number):
         codename =  s.data['meta']['mapping'][number]
-        return s.data[codename]['name']
+        return s._summary(codename)['name']
 
     def problem_data(s, number):
+        """The data for the problem, or None. If the problem's data is found to be
+           corrupt (see Container), an error is printed too."""
         try:
             codename =  s.data['meta']['mapping'][str(number)]
             return s.data[codename]
+        except ValueError as exc:
+            Impl.error(str(exc), 'Please run l.force_update()')
+            return None
         except KeyError:
             return None
 
+    def cases(s, number, dataset):
+        """The test cases (a CaseSet) of the problem's _dataset_: 'samples',
+           'judge' or 'auto' (see Judge.auto_pairs). They are normalised once,
+           when first asked for, and then kept. Returns None if there is no
+           data for the problem."""
+        key = (str(number), dataset)
+        if key not in s.case_store:
+            pd = s.problem_data(number)
+            if pd is None:
+                return None
+            if dataset == 'auto':
+                pairs = Judge.auto_pairs(pd)
+            else:
+                pairs = Judge.input_output_pairs(pd[dataset], pd['newline'])
+            s.case_store[key] = CaseSet(pairs)
+        return s.case_store[key]
+
+    def large_pairs(s, number):
+        """Returns a list of (LargeInput, expected) for the problem's large tests,
+           which are kept in separate compressed files rather than in DATA2.txt.
+           Files we don't have (or that don't match their checksum) are
+           downloaded. Returns None, after printing an error, if that fails.
+
+           In the problem data, 'large' is a list of dictionaries
+               {"file": name in LARGE_TESTS_DIRECTORY, "sha1": of that file,
+                "size": characters of input, "out": expected output}
+           where 'out' uses the problem's newline character, as usual."""
+        pd = s.problem_data(number)
+        result = []
+        for entry in pd.get('large', []):
+            path = s._large_test_file(entry)
+            if path is None:
+                return None
+            expected = '\n'.join(entry['out'].split(pd['newline']))
+            result.append((LargeInput(path, entry['size']), expected))
+        return result
+
+    def _large_test_file(s, entry):
+        """Returns the path of the large test file described by _entry_,
+           downloading it if necessary, or None on failure."""
+        path = Path(LARGE_TESTS_DIRECTORY) / entry['file']
+        if path.is_file() and Container.sha1(path) == entry['sha1']:
+            return path
+        try:
+            path.parent.mkdir(exist_ok=True)
+            Updater.download(LARGE_TESTS_URL.format(entry['file']), path, conditional=False)
+        except OSError:
+            Impl.error(f"Unable to download large test '{entry['file']}'",
+                       "Check Internet connection")
+            return None
+        if Container.sha1(path) != entry['sha1']:
+            Impl.error(f"Large test '{entry['file']}' is corrupt", "Please run l.update()")
+            return None
+        return path
+
+    def _summary(s, codename):
+        """A dictionary with (at least) the 'id' and 'name' of the problem, got
+           without decoding its test data if possible."""
+        if isinstance(s.data, Container):
+            return s.data.index[codename]
+        return s.data[codename]
+
+    @staticmethod
+    def data_file():
+        """The path of the data file in use: DATA2.txt, or else DATA.txt."""
+        packed = Path(PACKED_FILENAME)
+        return packed if packed.is_file() else Path(DATA_FILENAME)
+
+    def _data_from_container(s):
+        """Returns a Container, or None if DATA.bin is missing, invalid or was
+           not built from the current data file"""
+        p = Path(CONTAINER_FILENAME)
+        if not p.is_file():
+            return None
+        try:
+            container = Container(p)
+        except (OSError, ValueError):
+            return None
+        if not container.matches(s.data_file()):
+            container.close()
+            return None
+        return container
+
+    def _write_container(s):
+        """Builds DATA.bin from the data so that the next start is quick.
+           Failure to write it is not a problem."""
+        try:
+            Container.write(s.data, CONTAINER_FILENAME, s.data_file())
+        except OSError:
+            pass
+
+    def _discard_container(s):
+        """Closes and deletes DATA.bin, which is about to become stale."""
+        if isinstance(s.data, Container):
+            s.data.close()
+        try:
+            Path(CONTAINER_FILENAME).unlink()
+        except OSError:
+            pass
+
     def _data_from_file(s):
-        """Returns the data dictionary, or None if there is no file"""
-        p = Path(DATA_FILENAME)
+        """Returns the data (a Container, or a dictionary if the file is in the
+           older format), or None if there is no file or it is corrupt (when an
+           error is printed, and a new file will be downloaded)"""
+        p = s.data_file()
         if p.is_file():
-            x = p.read_text()
-            if len(x) < 100:
-                Impl.error('Invalid data in DATA.txt (too short)',
-                           'Please run l.update()')
-                return
-            x = x.encode('ascii')
-            x = base64.decodebytes(x)
-            x = x.decode('ascii')
-            return json.loads(x)
+            try:
+                x = p.read_text()
+                if len(x) < 100:
+                    raise ValueError('too short')
+                x = x.encode('ascii')
+                x = base64.decodebytes(x)
+                if x.startswith(Container.MAGIC):
+                    return Container(x)
+                x = x.decode('ascii')
+                return json.loads(x)
+            except ValueError as exc:
+                # This includes binascii.Error, UnicodeError and JSONDecodeError.
+                Impl.error(f'Invalid data in {p} ({exc})',
+                           'It will be downloaded again')
+                return None
         else:
             return None
 
-    def _force_update(s):
-        """Attempt an update of the data file."""
-        if s._update_from_github():
+    def _force_update(s, version=None):
+        """Attempt an update of the data file. If _version_ (the latest data
+           version) is given, see _update_from_github."""
+        if s._update_from_github(version):
+            s._discard_container()
+            s.case_store = dict()
             s.data = s._data_from_file()
+            if s.data is not None:
+                s._write_container()
+
+    def _update_from_github(s, version=None):
+        """Downloads the data file from Github and moves it into place; doesn't
+           activate it. Returns True on success, or False on failure (or if the
+           file was already up to date).
+           When _version_ (the latest data version) is given, a patch from our
+           version to that one is tried first, and otherwise the download is
+           conditional, so an unchanged DATA2.txt is not downloaded again."""
+        try:
+            if version is not None and s.is_ok() and s._update_from_patch(version):
+                Impl.info(f"{PACKED_FILENAME} patched to version {version} from GitHub")
+                return True
+            conditional = version is not None
+            if Updater.download(PACKED_URL, PACKED_FILENAME, conditional=conditional):
+                Impl.info(f"{PACKED_FILENAME} updated from GitHub")
+                return True
+            else:
+                Impl.info(f"{PACKED_FILENAME} is already up to date")
+                return False
+        except OSError as exc:
+            if isinstance(exc, Updater.network().ContentTooShortError):
+                Impl.error("Updating the data was only partially successful; try again")
+            else:
+                Impl.error("Unable to update data; check Internet connection")
+            return False
 
-    def _update_from_github(s):
-        """Downloads the data file from Github; doesn't activate it.
-           Returns True on success, or False on failure."""
-        tmpfile = DATA_FILENAME + '.tmp'
+    def _update_from_patch(s, version):
+        """Applies the patch from our data version to _version_, if GitHub has
+           one, and writes the result to DATA2.txt. Returns True on success."""
+        patch = Updater.fetch_patch(s.version(), version)
+        if patch is None:
+            return False
         try:
-            localname, _ = urllib.request.urlretrieve(DATA_URL)
-            if Path(DATA_FILENAME).is_file():
-                Path(DATA_FILENAME).unlink()
-            shutil.copy(localname, DATA_FILENAME)
-            Impl.info("DATA.txt updated from GitHub")
-            return True
-        except urllib.request.ContentTooShortError:
-            Impl.error("Updating the data was only partially successful; try again")
+            data = Updater.apply_patch(s.data, patch)
+        except (KeyError, ValueError):
             return False
-        except urllib.request.URLError:
-            Impl.error("Unable to update data; check Internet connection")
+        previous = s.data if isinstance(s.data, Container) else None
+        Updater.replace_file(PACKED_FILENAME, Updater.encode_data(data, previous))
+        Updater.forget(PACKED_URL)
+        return True
+
+
+
+class Container(Mapping):
+    """Read-only access to the learninformatics data in its packed form, which is
+       what DATA2.txt holds (base64-encoded) and what DATA.bin holds (as it is,
+       memory-mapped rather than read). It behaves like a dictionary
+       {'meta': ..., codename: problem, ...}, but each problem is decompressed,
+       checked and decoded only when first asked for.
+
+       The packed form is laid out as:
+           LIDATA 2\\n
+           <length of header in bytes>\\n
+           <header: JSON {"meta": ...,
+                          "index": {codename: {"id", "name", "offset", "length", "sha1"}},
+                          "source": {"sha1", "size", "mtime_ns", "data_version"}}>
+           <each problem as zlib-compressed compact JSON, at _offset_ from the end
+            of the header>
+       _sha1_ is that of the problem's JSON before compression, so a damaged
+       problem is noticed when it is decoded. The id and name of every problem
+       are in the header, so listing exercises does not decode any test data.
+       Only DATA.bin has a _source_: it is a cache of the data file (see
+       LIData.data_file), keyed by the SHA-1 of that file and its data version
+       (see matches)."""
+
+    MAGIC = b'LIDATA 2\n'
+
+    def __init__(s, source):
+        """_source_ is the path of a file to map, or the packed bytes."""
+        if isinstance(source, bytes):
+            s.mmap = None
+            s.buffer = source
+        else:
+            with open(source, 'rb') as f:
+                s.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            s.buffer = s.mmap
+        try:
+            if s.buffer[:len(Container.MAGIC)] != Container.MAGIC:
+                raise ValueError()
+            start = len(Container.MAGIC)
+            end = s.buffer.find(b'\n', start)
+            s.base = end + 1 + int(s.buffer[start:end])
+            header = json.loads(s.buffer[end + 1:s.base])
+            s.meta = header['meta']
+            s.index = header['index']
+            s.source = header.get('source')
+        except Exception:
+            s.close()
+            name = source if s.mmap is not None else PACKED_FILENAME
+            raise ValueError(f'{name} is not valid packed learninformatics data')
+        s.problems = dict()
+
+    def __getitem__(s, key):
+        if key == 'meta':
+            return s.meta
+        if key not in s.problems:
+            import hashlib
+            try:
+                text = zlib.decompress(s.blob(key))
+            except zlib.error:
+                text = None
+            if text is None or hashlib.sha1(text).hexdigest() != s.index[key]['sha1']:
+                raise ValueError(f"The data for problem '{key}' is corrupt")
+            s.problems[key] = json.loads(text)
+        return s.problems[key]
+
+    def __iter__(s):
+        yield 'meta'
+        yield from s.index
+
+    def __len__(s):
+        return 1 + len(s.index)
+
+    def blob(s, key):
+        """The packed (compressed) bytes of a problem."""
+        entry = s.index[key]
+        start = s.base + entry['offset']
+        return bytes(s.buffer[start:start + entry['length']])
+
+    def close(s):
+        if s.mmap is not None:
+            s.mmap.close()
+
+    def matches(s, source_path):
+        """True if this container was built from the file at _source_path_ (or
+           if that file doesn't exist, leaving the container as the only data).
+           When the size and modification time are unchanged, the file is not
+           even read; otherwise its SHA-1 is compared."""
+        source_path = Path(source_path)
+        if not source_path.is_file():
+            return True
+        if s.source is None or s.source['data_version'] != s.meta['data_version']:
             return False
+        st = source_path.stat()
+        if (st.st_size, st.st_mtime_ns) == (s.source['size'], s.source['mtime_ns']):
+            return True
+        return Container.sha1(source_path) == s.source['sha1']
+
+    @staticmethod
+    def sha1(path):
+        import hashlib
+        return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+    @staticmethod
+    def problem_json(problem):
+        """(sha1, compact JSON bytes) for the problem dictionary. The JSON is
+           what is compressed to pack the problem; the SHA-1 is found without
+           compressing it."""
+        import hashlib
+        text = json.dumps(problem, separators=(',', ':')).encode('utf-8')
+        return (hashlib.sha1(text).hexdigest(), text)
 
+    @staticmethod
+    def encode(data, source=None, previous=None):
+        """The packed bytes for _data_, which is a dictionary or a Container (whose
+           packed problems are copied as they are). A problem that is unchanged
+           from the Container _previous_ (same SHA-1) is copied from there
+           rather than compressed again. _source_ is recorded in the header if
+           given (see matches)."""
+        index, blobs, offset = dict(), [], 0
+        for codename in data:
+            if codename == 'meta':
+                continue
+            if isinstance(data, Container):
+                sha1, blob = data.index[codename]['sha1'], data.blob(codename)
+                problem = data.index[codename]
+            else:
+                problem = data[codename]
+                sha1, text = Container.problem_json(problem)
+                reused = (previous is not None
+                          and previous.index.get(codename, {}).get('sha1') == sha1)
+                blob = previous.blob(codename) if reused else zlib.compress(text, 9)
+            index[codename] = {'id': problem['id'], 'name': problem['name'],
+                               'offset': offset, 'length': len(blob), 'sha1': sha1}
+            blobs.append(blob)
+            offset += len(blob)
+        header = {'meta': data['meta'], 'index': index}
+        if source is not None:
+            header['source'] = source
+        header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        length = f'{len(header)}\n'.encode('ascii')
+        return b''.join([Container.MAGIC, length, header] + blobs)
+
+    @staticmethod
+    def write(data, path, source_path):
+        """Writes the data (a dictionary or Container, as decoded from the data
+           file) to _path_ as DATA.bin. _source_path_ is the file it came from;
+           its hash is recorded so that a stale container can be recognised. The
+           file is written under a temporary name and then moved into place, so
+           another process never sees half a container."""
+        st = Path(source_path).stat()
+        source = {'sha1': Container.sha1(source_path), 'size': st.st_size,
+                  'mtime_ns': st.st_mtime_ns, 'data_version': data['meta']['data_version']}
+        content = Container.encode(data, source)
+        tmpfile = Path(str(path) + '.tmp')
+        with open(tmpfile, 'wb') as f:
+            f.write(content)
+        os.replace(tmpfile, path)
 
 # --------------------------------------------------------------------------- #
 
 class Interface:
-    data = None        # This will be set at the bottom of the file, to get around
-                       # forward-declaration problems.
+    data = None        # The LIData, loaded by ensure_data when first needed.
+    last_report = None # Details of the last test or judge, for l.report().
 
     @staticmethod
     def ensure_data():
+        if Interface.data is None:
+            Interface.data = LIData()
         if Interface.data.is_ok():
             return Interface.data
         else:
@@ -206,7 +661,7 @@ class Interface:
 
         if Impl.lower_version(data.version(), version_info['data']):
             Impl.info('More recent data available; updating')
-            data._force_update()
+            data._force_update(version_info['data'])
         else:
             print(f'Your data is at the latest version ({data.version()})')
 
@@ -224,7 +679,13 @@ class Interface:
     def force_update():
         data = Interface.ensure_data()
         data._force_update()
-        Impl.update_software()
+        Impl.update_software(conditional=False)
+
+    @staticmethod
+    def calibrate():
+        print('Measuring the speed of this computer...')
+        factor = Calibration.calibrate()
+        print(f'Time limits here are {factor} times those on the judging computer')
 
     # TODO: include book version  --- um, how?
     @staticmethod
@@ -267,14 +728,16 @@ class Interface:
         print()
 
     @staticmethod
-    def run(function_id, data=None):
+    def run(function_id, data=None, out=None):
         """Runs the user-supplied or user-implied function with two arguments IN and OUT
            set to stdin and stdout respectively. This enables interactive running of user
            code.  If function_id is a three-digit integer, then find the corresponding
            function in the user's environment (e.g. ex203).
            Otherwise function_id is taken to be an actual function.
-           If _data_ is provided, this forms the input instead of stdin. It should,
-           if necessary, be a multi-line string."""
+           If _data_ is provided, this forms the input instead of stdin (see
+           input_stream), and the time taken is printed afterwards.
+           If _out_ is provided, the output goes there instead of stdout (see
+           output_stream)."""
         if type(function_id) == int:
             status, f = Impl.get_function(function_id)
             if status != 'ok':
@@ -282,18 +745,69 @@ class Interface:
         elif type(function_id) == type(info):
             f = function_id
 
-        if data is None:
-            f(sys.stdin, sys.stdout)
-        else:
-            data = StringIO(data)
-            f(data, sys.stdout)
+        IN = sys.stdin if data is None else Interface.input_stream(data)
+        OUT = sys.stdout if out is None else Interface.output_stream(out)
+        start = time.perf_counter()
+        try:
+            f(IN, OUT)
+        finally:
+            seconds = time.perf_counter() - start
+            for stream, given in [(IN, data), (OUT, out)]:
+                if given is not None and stream is not given:
+                    stream.close()
+        if data is not None or out is not None:
+            print()
+            note = Interface.output_note(OUT, out)
+            print(f'(Finished in {Scaler.format_seconds(seconds)}{note})')
+
+    @staticmethod
+    def input_stream(data):
+        """IN for l.run, from _data_: a string of input; the name of a file (a
+           string with no newline that names an existing file) or a Path; an
+           open file (binary files are decoded as UTF-8); or any other iterable
+           of lines, such as a generator, which is read lazily (see LineInput).
+           Files are memory-mapped (see MappedInput), so even a very big file
+           is read only as the function asks for it."""
+        if isinstance(data, str) and ('\n' in data or not os.path.isfile(data)):
+            return StringIO(data)
+        if isinstance(data, (str, Path)):
+            return MappedInput.open(data)
+        if isinstance(data, TextIOBase):
+            return data
+        if hasattr(data, 'read'):
+            return MappedInput.wrap(data)
+        return LineInput(data)
 
     @staticmethod
-    def test(number):
+    def output_stream(out):
+        """OUT for l.run, from _out_: the name (or Path) of a file to write, an
+           open text file, or False to throw the output away, only counting it
+           (see CountingOutput)."""
+        if out is False:
+            return CountingOutput()
+        if isinstance(out, (str, Path)):
+            return open(out, 'w', encoding='utf-8')
+        return out
+
+    @staticmethod
+    def output_note(OUT, out):
+        """What l.run says about the output after the time taken."""
+        if isinstance(OUT, CountingOutput):
+            return f'; the output was {OUT.lines} lines, {OUT.characters} characters'
+        if isinstance(out, (str, Path)):
+            return f'; the output is in {out}'
+        return ''
+
+    @staticmethod
+    def test(number, parallel=False, cache=True, fast=False, minimise=False):
         """For the given problem number, runs the user-supplied function with
            the samples data and prints a helpful message (i.e. detailing
            the data) if it doesn't pass.
-           A number of (say) 302 implies a function name ex302."""
+           A number of (say) 302 implies a function name ex302.
+           See Judge.worker_count for the meaning of _parallel_, ResultCache
+           for _cache_ and Judge.iter_fast_results for _fast_ (which doesn't
+           use the cache). With _minimise_, if the samples pass, the Minimiser
+           looks for a small input that fails."""
         assert type(number) == int
         data = Interface.ensure_data()
 
@@ -307,20 +821,53 @@ class Interface:
         else:
             print()
             print(f"Running sample data for problem: {pd['name']}")
-            testdata, newline = pd['samples'], pd['newline']
-            testdata = Judge.input_output_pairs(testdata, newline)
-            results = Judge.run_and_collect_results(function, testdata)
-            for status, datain, dataout, expected in results:
-                if status != 'AC':
-                    Judge.print_helpful_info(status, datain, dataout, expected)
-            Judge.print_and_return_result_summary(results)
+            key = ResultCache.key(function, 'test', pd, data.version())
+            results = ResultCache.get(key) if cache and not fast else None
+            numbers = None
+            if fast:
+                samples = data.cases(number, 'samples')
+                testdata = list(samples)
+                numbers = []
+                order = Judge.schedule(pd, 'test', samples.sizes)
+                results = list(Judge.iter_fast_results(function, testdata, order, numbers,
+                                                       Judge.worker_count(parallel),
+                                                       limits=Judge.limits(pd), keep=True,
+                                                       **Judge.comparison(pd)))
+            elif results is None:
+                testdata = data.cases(number, 'samples')
+                workers = Judge.worker_count(parallel)
+                results = Judge.run_and_collect_results(function, testdata, workers,
+                                                        limits=Judge.limits(pd), keep=True,
+                                                        **Judge.comparison(pd))
+                ResultCache.put(key, results)
+            else:
+                ResultCache.print_note(number)
+            for result in results:
+                if result.status not in ('AC', 'SKIP'):
+                    Judge.print_helpful_info(result.status, result.datain, result.dataout,
+                                             result.expected)
+            if minimise and all(result.status == 'AC' for result in results):
+                if Minimiser.supports(pd):
+                    Minimiser.print_counterexample(function, pd, data.version(), cache)
+                else:
+                    Impl.info(f"Problem {number} has no search for a failing input",
+                              "Only its samples can be shown; try l.judge")
+            cases = []
+            summary = Judge.print_and_return_result_summary(results, cases, numbers)
+            if not fast:
+                Judge.record_timings(pd, 'test', cases)
+            Interface.last_report = Judge.report(number, pd, summary, cases)
         print()
 
     @staticmethod
-    def judge(number):
+    def judge(number, parallel=False, cache=True, fast=False):
         """For the given problem name, runs the user-supplied function with
            the prepared judging data and prints the result (AC, WA, ...) for
-           each test case."""
+           each test case. Results are printed as they arrive, in test order
+           (or in the order they are run, with _fast_).
+           See Judge.worker_count for the meaning of _parallel_, ResultCache
+           for _cache_ and Judge.iter_fast_results for _fast_ (which doesn't
+           use the cache). A token is given only if every case is AC."""
         assert type(number) == int
         data = Interface.ensure_data()
 
@@ -334,20 +881,123 @@ class Interface:
         else:
             print()
             print(f"Running judging data for problem: {pd['name']}")
-            judgedata, newline = pd['judge'], pd['newline']
-            judgedata = list(Judge.input_output_pairs(judgedata, newline))
-            results = Judge.run_and_collect_results(function, judgedata)
-            summary = Judge.print_and_return_result_summary(results)
+            key = ResultCache.key(function, 'judge', pd, data.version())
+            results = ResultCache.get(key) if cache and not fast else None
+            numbers = None
+            if results is None:
+                largedata = data.large_pairs(number)
+                if largedata is None:
+                    return
+                judgecases = data.cases(number, 'judge')
+                autocases = data.cases(number, 'auto')
+                judgedata = chain(judgecases, largedata, autocases)
+                workers = Judge.worker_count(parallel)
+                if fast:
+                    judgedata = list(judgedata)
+                    largesizes = tuple(datain.size for datain, _ in largedata)
+                    sizes = judgecases.sizes + largesizes + autocases.sizes
+                    numbers = []
+                    order = Judge.schedule(pd, 'judge', sizes)
+                    results = Judge.iter_fast_results(function, judgedata, order, numbers,
+                                                      workers, limits=Judge.limits(pd),
+                                                      keep=DEBUG_LEARNINFORMATICS,
+                                                      **Judge.comparison(pd))
+                else:
+                    results = Judge.iter_results(function, judgedata, workers,
+                                                 limits=Judge.limits(pd),
+                                                 keep=DEBUG_LEARNINFORMATICS,
+                                                 **Judge.comparison(pd))
+                    results = ResultCache.recording(key, results)
+            else:
+                ResultCache.print_note(number)
+            cases = []
+            summary = Judge.print_and_return_result_summary(results, cases, numbers)
+            if not fast:
+                Judge.record_timings(pd, 'judge', cases)
+            Interface.last_report = Judge.report(number, pd, summary, cases)
             print()
-            if all(x[0] == 'AC' for x in results):
+            if all(status == 'AC' for status in summary):
                 print("TOKEN:", Impl.token(number, pd['id']))
             else:
                 print('Better luck next time')
+                if Minimiser.supports(pd):
+                    print(f'(l.test({number}, minimise=True) can look for a small input '
+                          f'that fails)')
+        print()
+
+    @staticmethod
+    def scale(number):
+        """For the given problem number, times the user-supplied function on
+           inputs of increasing size and prints the growth it seems to have and
+           the time it predicts for the judge's largest input. Only problems with
+           a 'scale' entry (see Scaler) can be timed like this."""
+        assert type(number) == int
+        data = Interface.ensure_data()
+
+        status, function = Impl.get_function(number)
+        if status != 'ok':
+            return
+
+        pd = data.problem_data(number)
+        if pd is None:
+            Impl.error(f"Unable to access problem data for number '{number}'")
+        elif 'scale' not in pd:
+            Impl.info(f"Problem {number} has no test of speed",
+                      "Its judging data is small, so l.test and l.judge are quick anyway")
+        else:
+            print()
+            print(f"Timing bigger and bigger inputs for problem: {pd['name']}")
+            print()
+            print(f"    {'size':>10}  {'time':>10}")
+            generator, maximum = pd['scale']['generator'], pd['scale']['max']
+            points = []
+            limits = Judge.limits(pd)
+            measured = Scaler.measure(function, generator, maximum, limits)
+            for size, status, seconds in measured:
+                if status != 'OK':
+                    print(f"    {size:>10}  {status:>10}")
+                    break
+                print(f"    {size:>10}  {Scaler.format_seconds(seconds):>10}")
+                points.append((size, seconds))
+            print()
+            Scaler.print_prediction(points, status, maximum, limits[0])
+        print()
+
+    @staticmethod
+    def profile(number, lines=False):
+        """For the given problem number, runs the user-supplied function under
+           the Profiler and prints what it finds. Only the samples, or an input
+           made by the problem's Scaler generator, are used: never judging data."""
+        assert type(number) == int
+        data = Interface.ensure_data()
+
+        status, function = Impl.get_function(number)
+        if status != 'ok':
+            return
+
+        pd = data.problem_data(number)
+        if pd is None:
+            Impl.error(f"Unable to access problem data for number '{number}'")
+        else:
+            datain, description = Profiler.choose_input(pd, data.cases(number, 'samples'))
+            print()
+            print(f"Profiling problem: {pd['name']}")
+            print(f"Input: {description}")
+            print()
+            limits = Judge.limits(pd)
+            status, report, metrics = Profiler.run(function, datain, lines, limits)
+            if status == 'OK':
+                Profiler.print_report(report)
+            else:
+                Judge.print_helpful_info(status, datain, report, None)
         print()
 
 # --------------------------------------------------------------------------- #
 
 class Admin:
+    # The outcome of a case that is not run, because an earlier one had a TLE.
+    SKIPPED = ('SKIP', None, {'wall': 0.0, 'cpu': None, 'memory': None})
+
     @staticmethod
     def quiet_test(number):
         """Run all available tests for exercise (number) and return True for complete
@@ -363,19 +1013,214 @@ class Admin:
         if pd is None:
             Impl.error(f"Unable to access problem data for number '{number}'")
         else:
-            testdata, judgedata, newline = pd['samples'], pd['judge'], pd['newline']
-            alldata = testdata + judgedata
-            alldata = Judge.input_output_pairs(alldata, newline)
-            results = Judge.run_and_collect_results(function, alldata)
-            return all(x[0] == 'AC' for x in results)
+            alldata = chain(data.cases(number, 'samples'), data.cases(number, 'judge'))
+            results = Judge.run_and_collect_results(function, alldata,
+                                                    limits=Judge.limits(pd),
+                                                    **Judge.comparison(pd))
+            return all(x.status == 'AC' for x in results)
 
     @staticmethod
-    def quiet_test_all():
-        """Run quiet_test(x) on all available exercise x."""
+    def quiet_test_all(report=None, parallel=True):
+        """Run all available tests for every exercise x whose function exx is
+           defined by the caller, print 'x NNN' for each one that fails, and
+           return a list of dictionaries describing the outcome (see
+           Admin.report_entry).
+           All the cases of all the exercises are judged at once by one Sandbox
+           pool, so one slow solution cannot hold up the others. Once a case of
+           an exercise exceeds the time limit, its remaining cases are not run
+           (they are reported as SKIP).
+           If _report_ is a filename, the report is also written to it as JSON
+           lines (one exercise per line); '-' means standard output.
+           See Judge.worker_count for the meaning of _parallel_."""
         data = Interface.ensure_data()
+        _locals = sys._getframe(1).f_locals
+        entries, functions, cases = [], dict(), []
         for nnn in data.exercise_numbers():
-            if not Admin.quiet_test(int(nnn)):
-                print(f'x {nnn}')
+            pd = data.problem_data(nnn)
+            entry = Admin.report_entry(nnn, pd, data.version())
+            entries.append(entry)
+            function = _locals.get(f'ex{nnn}')
+            if function is None:
+                entry['status'] = 'missing'
+                continue
+            functions[nnn] = function
+            limits = Judge.limits(pd)
+            for dataset, datain, expected in Admin.all_cases(data, nnn):
+                checker = OutputChecker(expected, **Judge.comparison(pd))
+                cases.append((entry, dataset, datain, expected, checker, limits))
+
+        # The jobs are made as the workers become free, so that the cases of an
+        # exercise that has had a TLE can be left out.
+        sent, keys, timed_out = [], [], set()
+        def jobs():
+            for entry, dataset, datain, expected, checker, limits in cases:
+                sent.append(entry['number'] not in timed_out)
+                if sent[-1]:
+                    keys.append(entry['number'])
+                    yield (entry['number'], datain, checker, limits)
+
+        outcomes = []
+        def collect(outcome):
+            if outcome[0] == 'TLE':
+                timed_out.add(keys[len(outcomes)])
+            outcomes.append(outcome)
+
+        if Sandbox.is_supported():
+            with Sandbox(functions, size=Judge.worker_count(parallel)) as sandbox:
+                for outcome in sandbox.imap_jobs(jobs()):
+                    collect(outcome)
+        else:
+            for key, datain, checker, _ in jobs():
+                collect(Sandbox.execute(functions[key], datain, checker))
+
+        outcomes = iter(outcomes)
+        for (entry, dataset, datain, expected, _, _), run in zip(cases, sent):
+            status, dataout, metrics = next(outcomes) if run else Admin.SKIPPED
+            result = Judge.verdict(status, (datain, expected), dataout, metrics)
+            Admin.add_case(entry, dataset, result)
+
+        for entry in entries:
+            if entry['status'] != 'AC':
+                print(f"x {entry['number']}")
+        if report is not None:
+            lines = [json.dumps(entry) for entry in entries]
+            if report == '-':
+                print(*lines, sep='\n')
+            else:
+                Path(report).write_text('\n'.join(lines) + '\n')
+        return entries
+
+    @staticmethod
+    def report_entry(number, pd, data_version):
+        """A fresh report dictionary for one exercise. Its 'status' is 'AC' until
+           a case fails, when it becomes that case's status; 'missing' means the
+           exercise function was not defined."""
+        return {'number': number, 'id': pd['id'], 'name': pd['name'],
+                'data_version': data_version, 'status': 'AC', 'seconds': 0.0,
+                'cases': []}
+
+    @staticmethod
+    def all_cases(data, number):
+        """Yields (dataset, datain, expected) for every test case of the exercise:
+           the samples, then the judging data (including large and generated
+           cases). _dataset_ is 'samples', 'judge', 'large' or 'auto'."""
+        for dataset in ['samples', 'judge', 'large', 'auto']:
+            if dataset == 'large':
+                pairs = data.large_pairs(number) or []
+            else:
+                pairs = data.cases(number, dataset)
+            for datain, expected in pairs:
+                yield (dataset, datain, expected)
+
+    @staticmethod
+    def add_case(entry, dataset, result, reasons=True):
+        """Adds the _result_ of one case (a Result, as from Judge.verdict) to the
+           report _entry_, updating its status and total time. With
+           reasons=False the 'reason' is left out, because for WA it shows the
+           expected output."""
+        status, metrics = result.status, result.metrics
+        entry['cases'].append({
+            'case': len(entry['cases']) + 1,
+            'dataset': dataset,
+            'status': status,
+            'seconds': round(metrics['wall'], 6),
+            'cpu_seconds': metrics['cpu'] and round(metrics['cpu'], 6),
+            'memory_mb': metrics['memory'],
+            'reason': Admin.failure_reason(status, result.dataout, result.expected,
+                                           metrics) if reasons else None,
+        })
+        entry['seconds'] = round(entry['seconds'] + metrics['wall'], 6)
+        if entry['status'] == 'AC' and status != 'AC':
+            entry['status'] = status
+
+    @staticmethod
+    def failure_reason(status, dataout, expected, metrics=None):
+        """A short human-readable reason for a non-AC result, or None."""
+        if status == 'WA':
+            return f'expected {expected[:60]!r} but got {dataout[:60]!r}'
+        elif status == 'RTE':
+            return f'{type(dataout).__name__}: {dataout}'
+        elif status == 'TLE':
+            seconds = metrics['wall'] if metrics else TIME_LIMIT
+            return f'time limit exceeded ({seconds:.2f} seconds)'
+        elif status == 'OLE':
+            return f'more than {OUTPUT_LIMIT} characters of output'
+        elif status == 'MLE':
+            return f'memory limit of {MEMORY_LIMIT} MB exceeded'
+        elif status == 'SKIP':
+            return 'not run, because an earlier case exceeded the time limit'
+        else:
+            return None
+
+# --------------------------------------------------------------------------- #
+
+class Submission:
+    """An exercise function given as source code (e.g. a student's file) rather
+       than as a function object. It can be pickled, so unlike a function it can
+       be sent to a Sandbox worker as the key of a job (see imap_jobs), and it is
+       only compiled and run there, never in the process that judges it.
+       Calling it runs the function exNNN defined by the source.
+
+       Top-level calls into this module, such as l.judge(107), are left out
+       (see definitions); everything else in the source is run, including
+       setup such as sys.setrecursionlimit(...). A Sandbox gives each
+       submission a freshly forked worker (see imap_jobs), which loads it once,
+       however many cases it runs, so what one submission does to modules or
+       to its namespace can't reach another."""
+
+    serials = count()  # numbers submissions in the process that makes them
+    loaded = None      # (serial, namespace) of the submission loaded in a worker
+
+    def __init__(s, source, number, filename='<submission>'):
+        s.source = source
+        s.number = number
+        s.filename = filename
+        s.serial = next(Submission.serials)
+
+    def __call__(s, IN, OUT):
+        function = s.load().get(f'ex{s.number}')
+        if function is None:
+            raise NameError(f"{s.filename} has no function 'ex{s.number}'")
+        function(IN, OUT)
+
+    def load(s):
+        """The namespace of the source's definitions, run on first use. Only
+           one submission's namespace is kept."""
+        if Submission.loaded is None or Submission.loaded[0] != s.serial:
+            namespace = {'__name__': '__submission__', '__file__': s.filename}
+            exec(Submission.definitions(s.source, s.filename), namespace)
+            Submission.loaded = (s.serial, namespace)
+        return Submission.loaded[1]
+
+    @staticmethod
+    def definitions(source, filename):
+        """The source compiled without its top-level statements that call this
+           module: l.test(107) or judge(107), for example, after
+           'import learninformatics as l' or 'from learninformatics import judge'."""
+        import ast
+        tree = ast.parse(source, filename)
+        modules, functions = set(), set()
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                modules.update(alias.asname or alias.name for alias in node.names
+                               if alias.name == __name__)
+            elif isinstance(node, ast.ImportFrom) and node.module == __name__:
+                functions.update(alias.asname or alias.name for alias in node.names)
+        if '*' in functions:
+            functions.update(name for name, value in globals().items()
+                             if isinstance(value, FunctionType)
+                             and not name.startswith('_'))
+        def _calls_module(node):
+            if not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)):
+                return False
+            function = node.value.func
+            while isinstance(function, ast.Attribute):
+                function = function.value
+                if isinstance(function, ast.Name) and function.id in modules:
+                    return True
+            return isinstance(function, ast.Name) and function.id in functions
+        tree.body = [node for node in tree.body if not _calls_module(node)]
+        return compile(tree, filename, 'exec')
 
 # --------------------------------------------------------------------------- #
 
@@ -404,12 +1249,37 @@ class Impl:
 
     @staticmethod
     def version_info():
-        """Returns dictionary, or None if unable to download."""
+        """Returns dictionary, or None if unable to download.
+           The answer is remembered (across sessions too) for VERSION_TTL seconds,
+           so repeated calls to l.update() don't use the network."""
+        state = Updater.load_state()
+        cached = state.get('version_info')
+        if cached is not None and 0 <= time.time() - cached['fetched'] < VERSION_TTL:
+            return cached['info']
         try:
-            x = urllib.request.urlopen(VERS_URL).read()
-            return json.loads(x)
-        except urllib.request.URLError:
+            x = Updater.network().urlopen(VERS_URL).read()
+            info = json.loads(x)
+        except (OSError, ValueError):
             return None
+        state['version_info'] = {'fetched': time.time(), 'info': info}
+        Updater.save_state(state)
+        return info
+
+    @staticmethod
+    def update_software(conditional=True):
+        """Downloads learninformatics.py from GitHub and moves it into place. The
+           new code is used the next time the module is imported."""
+        try:
+            if Updater.download(CODE_URL, CODE_FILENAME, conditional):
+                Impl.info(f"{CODE_FILENAME} updated from GitHub",
+                          "Restart to start using it")
+            else:
+                Impl.info(f"{CODE_FILENAME} is already up to date")
+        except OSError as exc:
+            if isinstance(exc, Updater.network().ContentTooShortError):
+                Impl.error("Updating the software was only partially successful; try again")
+            else:
+                Impl.error("Unable to update software; check Internet connection")
 
     @staticmethod
     def lower_version(a, b):
@@ -439,40 +1309,334 @@ class Impl:
     def token(number, codename):
         """Return a six-digit hex token based on the problem codename, appended to the
            problem number, as evidence of success."""
+        import hashlib
         t = hashlib.sha1(codename.encode('ascii')).hexdigest()[:6].lower()
         return f'{number}-{t}'
 
 # --------------------------------------------------------------------------- #
 
-class Judge:
+class TokenIndex:
+    """Checks tokens (see Impl.token) in bulk, e.g. those pasted into the
+       Informatics Leaderboard, against an index token -> exercise that is built
+       once per data version and cached in CACHE_DIRECTORY.
+       See etc/verify-tokens.py for the command-line interface."""
+
+    PATTERN = re.compile(r'[0-9]{3}-[0-9a-f]{6}')
+    index = None       # (data_version, {token: {number, id, name}}) once loaded
 
     @staticmethod
-    def run_and_collect_results(function, inoutpairs):
-        """Runs the function on all available data in the generator inoutpairs.
-           Returns a list of tuples: (status, instr, outstr, expected).
-           The reported status is 'AC' or 'WA' or 'RTE'.
-           In future, status may be 'TLE' or other values.
-           The strings 'outstr' and 'expected' are stripped for ease of
-           comparison."""
-        result = []
-        for datain, expected in inoutpairs:
-            _in, _out = StringIO(datain), StringIO()
+    def load(data):
+        """The index for _data_ (an LIData), from memory or the cache if they
+           are for the same data version, otherwise built and cached."""
+        version = data.version()
+        if TokenIndex.index is not None and TokenIndex.index[0] == version:
+            return TokenIndex.index[1]
+        path = Path(CACHE_DIRECTORY) / f'tokens-{version}.json'
+        try:
+            index = json.loads(path.read_text())
+        except (OSError, ValueError):
+            index = TokenIndex.build(data)
             try:
-                # TODO implement Process
-                function(_in, _out)
-                dataout = _out.getvalue().strip()
-                expected = expected.strip()
-                if dataout == expected:
-                    x = ('AC', datain, dataout, expected)
-                else:
-                    x = ('WA', datain, dataout, expected)
-            except Exception as exc:
-                if DEBUG_LEARNINFORMATICS: print(exc)
-                x = ('RTE', datain, exc, expected)
-            result.append(x)
-            _in.close(); _out.close()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                Updater.replace_file(path, json.dumps(index).encode('utf-8'))
+            except OSError:
+                pass
+        TokenIndex.index = (version, index)
+        return index
+
+    @staticmethod
+    def build(data):
+        index = dict()
+        for n in data.exercise_numbers():
+            id = data.problem_id(n)
+            index[Impl.token(n, id)] = {'number': n, 'id': id, 'name': data.problem_name(n)}
+        return index
+
+    @staticmethod
+    def verify(tokens, index):
+        """Yields a dictionary for each of the _tokens_ (strings; surrounding
+           space and case are ignored): {'token', 'valid': True, 'number', 'id',
+           'name'} if it is in the _index_, else {'token', 'valid': False,
+           'reason'}."""
+        for token in tokens:
+            token = token.strip().lower()
+            entry = index.get(token)
+            if entry is not None:
+                yield dict(token=token, valid=True, **entry)
+            elif TokenIndex.PATTERN.fullmatch(token):
+                yield {'token': token, 'valid': False, 'reason': 'no exercise has this token'}
+            else:
+                yield {'token': token, 'valid': False, 'reason': 'not a token (NNN-xxxxxx)'}
+
+# --------------------------------------------------------------------------- #
+
+class Updater:
+    """Downloads for l.update(). Files are only downloaded again if they have
+       changed (using the ETag and Last-Modified validators that GitHub sends),
+       data can be updated with a small patch instead of the whole file, and
+       every file is written under a temporary name and then renamed, so an
+       interrupted update never leaves half a file behind.
+       The validators and the cached VERSION.json are kept in
+       UPDATE_STATE_FILENAME.
+
+       A data patch (PATCH_URL, made by etc/bundle-data.py) is JSON:
+           {"from": old version, "to": new version, "meta": new meta,
+            "problems": {codename: new problem data, or null if removed}}"""
+
+    @staticmethod
+    def load_state():
+        try:
+            return json.loads(Path(UPDATE_STATE_FILENAME).read_text())
+        except (OSError, ValueError):
+            return dict()
+
+    @staticmethod
+    def save_state(state):
+        try:
+            Updater.replace_file(UPDATE_STATE_FILENAME, json.dumps(state).encode('utf-8'))
+        except OSError:
+            pass
+
+    @staticmethod
+    def forget(url):
+        """Forget the validators for _url_ (the local file no longer matches it)."""
+        state = Updater.load_state()
+        state.get('validators', dict()).pop(url, None)
+        Updater.save_state(state)
+
+    @staticmethod
+    def download(url, filename, conditional=True):
+        """Downloads _url_ to _filename_ unless (when _conditional_) the server
+           says it hasn't changed since we last downloaded it. Returns True if the
+           file was replaced, False if it was already up to date.
+           Raises URLError (or ContentTooShortError) on failure; both are OSErrors."""
+        urllib_request = Updater.network()
+        state = Updater.load_state()
+        validators = state.setdefault('validators', dict())
+        headers = dict()
+        if conditional and Path(filename).is_file() and url in validators:
+            if validators[url].get('etag'):
+                headers['If-None-Match'] = validators[url]['etag']
+            if validators[url].get('last_modified'):
+                headers['If-Modified-Since'] = validators[url]['last_modified']
+        try:
+            response = urllib_request.urlopen(urllib_request.Request(url, headers=headers))
+        except urllib_request.HTTPError as exc:
+            if exc.code == 304:
+                return False
+            raise
+        with response:
+            content = response.read()
+            expected = response.headers.get('Content-Length')
+            if expected is not None and len(content) < int(expected):
+                raise urllib_request.ContentTooShortError(
+                    f'{url}: got {len(content)} of {expected} bytes', content)
+            validators[url] = {'etag': response.headers.get('ETag'),
+                               'last_modified': response.headers.get('Last-Modified')}
+        Updater.replace_file(filename, content)
+        Updater.save_state(state)
+        return True
+
+    @staticmethod
+    def network():
+        """The urllib.request module, which is only imported when it is needed
+           because importing it is slow."""
+        import urllib.request
+        return urllib.request
+
+    @staticmethod
+    def replace_file(filename, content):
+        """Writes the bytes _content_ to _filename_ atomically."""
+        tmpfile = Path(str(filename) + '.tmp')
+        with open(tmpfile, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpfile, filename)
+
+    @staticmethod
+    def fetch_patch(old_version, new_version):
+        """Returns the data patch from _old_version_ to _new_version_, or None if
+           there isn't one (or it can't be downloaded)."""
+        try:
+            url = PATCH_URL.format(old_version, new_version)
+            with Updater.network().urlopen(url) as response:
+                patch = json.loads(response.read())
+        except (OSError, ValueError):
+            return None
+        if patch.get('from') != old_version or patch.get('to') != new_version:
+            return None
+        return patch
+
+    @staticmethod
+    def apply_patch(data, patch):
+        """Returns a new data dictionary: _data_ with _patch_ applied."""
+        if data['meta']['data_version'] != patch['from']:
+            raise ValueError(f"Patch is for data version {patch['from']}")
+        result = {'meta': patch['meta']}
+        for codename in data:
+            if codename != 'meta' and codename not in patch['problems']:
+                result[codename] = data[codename]
+            elif codename != 'meta' and patch['problems'][codename] is not None:
+                result[codename] = patch['problems'][codename]
+        for codename, problem in patch['problems'].items():
+            if problem is not None and codename not in result:
+                result[codename] = problem
+        if result['meta']['data_version'] != patch['to']:
+            raise ValueError(f"Patch does not produce data version {patch['to']}")
         return result
 
+    @staticmethod
+    def encode_data(data, previous=None):
+        """The contents of DATA2.txt for the data dictionary (the same encoding
+           as etc/bundle-data.py). See Container.encode for _previous_."""
+        return base64.encodebytes(Container.encode(data, previous=previous))
+
+# --------------------------------------------------------------------------- #
+
+class Judge:
+    timings = dict()   # (problem id, 'test' or 'judge') -> seconds for each case
+
+    @staticmethod
+    def run_and_collect_results(function, inoutpairs, workers=SANDBOX_WORKERS,
+                                rule='exact', tolerance=FLOAT_TOLERANCE, limits=None,
+                                keep=False):
+        """Runs the function on all available data in the generator inoutpairs.
+           Returns a list of Results (see Judge.verdict). The reported status
+           is 'AC' or 'WA' or 'RTE' or 'TLE' or 'OLE' or 'MLE'.
+           The output of a case that fails is only kept if _keep_ is true (it
+           is only needed to show the failure to the user).
+           See OutputChecker for _rule_ and _tolerance_, and Judge.limits for
+           _limits_ (by default TIME_LIMIT and CPU_TIME_LIMIT)."""
+        return list(Judge.iter_results(function, inoutpairs, workers, rule, tolerance,
+                                       limits, keep))
+
+    @staticmethod
+    def iter_results(function, inoutpairs, workers=SANDBOX_WORKERS,
+                     rule='exact', tolerance=FLOAT_TOLERANCE, limits=None, keep=False):
+        """Like run_and_collect_results, but yields each Result as soon as
+           it (and every earlier one) is known. The cases are run by _workers_
+           Sandbox workers at once so that the time limit can be enforced;
+           without 'fork' support the function is run inline."""
+        if not Sandbox.is_supported():
+            # No way to stop an infinite loop here, so 'TLE' is never reported.
+            for case in inoutpairs:
+                checker = OutputChecker(case[1], rule, tolerance)
+                status, dataout, metrics = Sandbox.execute(function, case[0], checker)
+                yield Judge.verdict(status, case, dataout, metrics, keep)
+            return
+        pairs = []
+        def _cases():
+            for case in inoutpairs:
+                pairs.append(case)
+                yield (case[0], OutputChecker(case[1], rule, tolerance))
+        time_limit, cpu_limit = limits or (TIME_LIMIT, CPU_TIME_LIMIT)
+        with Sandbox(function, size=workers, time_limit=time_limit,
+                     cpu_limit=cpu_limit) as sandbox:
+            for n, (status, dataout, metrics) in enumerate(sandbox.imap(_cases())):
+                case = pairs[n]
+                pairs[n] = None
+                yield Judge.verdict(status, case, dataout, metrics, keep)
+
+    @staticmethod
+    def iter_fast_results(function, inoutpairs, order, numbers, workers=SANDBOX_WORKERS,
+                          rule='exact', tolerance=FLOAT_TOLERANCE, limits=None, keep=False):
+        """Like iter_results, but the cases (a list) are run in the given _order_
+           (a list of indexes, see schedule), and the first result that isn't
+           AC is the last one run: every case not yet run is then yielded (in
+           test order) as a Result with status 'SKIP' and no metrics. Before each
+           result is yielded, its test number (index + 1) is appended to the list
+           _numbers_."""
+        run = set()
+        results = Judge.iter_results(function, (inoutpairs[i] for i in order), workers,
+                                     rule, tolerance, limits, keep)
+        try:
+            for i, result in zip(order, results):
+                run.add(i)
+                numbers.append(i + 1)
+                yield result
+                if result.status != 'AC':
+                    break
+        finally:
+            results.close()
+        for i, case in enumerate(inoutpairs):
+            if i not in run:
+                numbers.append(i + 1)
+                yield Result('SKIP', case)
+
+    @staticmethod
+    def schedule(pd, kind, sizes):
+        """The order (a list of indexes) in which to run the cases of a fast
+           l.test or l.judge (_kind_), whose inputs have the given _sizes_ (see
+           CaseSet.sizes and LargeInput.size): quickest first. That is known if
+           every case was timed on the last full run (see record_timings);
+           otherwise the smallest input is taken to be the quickest."""
+        times = Judge.timings.get((pd['id'], kind))
+        if times is not None and len(times) == len(sizes) and None not in times:
+            cost = times
+        else:
+            cost = sizes
+        return sorted(range(len(sizes)), key=lambda i: cost[i])
+
+    @staticmethod
+    def record_timings(pd, kind, cases):
+        """Remembers the time taken by each case (from Judge.case_details) of a
+           full l.test or l.judge (_kind_), for schedule."""
+        Judge.timings[(pd['id'], kind)] = [case['seconds'] for case in cases]
+
+    @staticmethod
+    def comparison(pd):
+        """The keyword arguments (rule, tolerance) for comparing output of the
+           problem with data _pd_. A problem may set 'compare' (see
+           OutputChecker) and, for 'float', 'tolerance'; the default is 'exact'."""
+        return {'rule': pd.get('compare', 'exact'),
+                'tolerance': pd.get('tolerance', FLOAT_TOLERANCE)}
+
+    @staticmethod
+    def limits(pd):
+        """The (wall-clock, CPU) seconds allowed for each case of the problem
+           with data _pd_ on this computer. A problem may set 'time_limit':
+           {'factor': F, 'reference': R}, meaning F times the R seconds its
+           reference solution takes on the slowest case on the reference
+           computer (but at least MIN_TIME_LIMIT); otherwise it is TIME_LIMIT.
+           Either way it is scaled by this computer's speed factor (see
+           Calibration), so that TLE means the same on every computer."""
+        limit = pd.get('time_limit')
+        if limit is None:
+            seconds = TIME_LIMIT
+        else:
+            seconds = max(MIN_TIME_LIMIT, limit['factor'] * limit['reference'])
+        seconds = round(seconds * Calibration.speed_factor(), 2)
+        return (seconds, round(seconds * CPU_TIME_LIMIT / TIME_LIMIT, 2))
+
+    @staticmethod
+    def worker_count(parallel):
+        """parallel=False means one worker; True means one per processor core;
+           a number means that many workers."""
+        if parallel is True:
+            return os.cpu_count() or 1
+        elif parallel:
+            return max(1, int(parallel))
+        else:
+            return SANDBOX_WORKERS
+
+    @staticmethod
+    def verdict(status, case, dataout, metrics=None, keep=True):
+        """Turns the outcome of running one _case_ (datain, expected) into a
+           Result. _status_ is 'AC', 'WA' or 'OLE' (dataout is the output, as
+           far as it was kept), 'RTE' (dataout is the exception), 'TLE' (dataout
+           is None) or 'OK' (dataout is all the output, still to be compared).
+           The output of a case that fails is kept in the Result (stripped) only
+           if _keep_ is true; that of a case that passes never is."""
+        if status == 'OK':
+            status = 'AC' if dataout.strip() == case[1].strip() else 'WA'
+        if status == 'RTE' and DEBUG_LEARNINFORMATICS: print(dataout)
+        if status == 'AC' or not keep:
+            dataout = None
+        elif isinstance(dataout, str):
+            dataout = dataout.strip()
+        return Result(status, case, dataout, metrics)
+
     @staticmethod
     def input_output_pairs(data, newline):
         """The given data is a list of [in, out, in, out, ...].
@@ -481,18 +1645,59 @@ class Judge:
            argument tells us what this special character is.
            The same applies to each 'out' string.
            Yields tuples (in, out), where both are strings and in probably contains
-           actual newline characters."""
+           actual newline characters.
+           (LIData.cases keeps the result, so this is done once per problem.)"""
         for i in range(0, len(data), 2):
-            a = '\n'.join(data[i+0].split(newline))
-            b = '\n'.join(data[i+1].split(newline))
+            a = data[i+0].replace(newline, '\n')
+            b = data[i+1].replace(newline, '\n')
             yield (a,b)
 
     @staticmethod
-    def auto_generated_pairs(function_name, n):
+    def auto_pairs(pd):
+        """The automatically generated input/output pairs for the problem with
+           data _pd_ (none unless it has an 'auto' entry, see AutoJudge)."""
+        if 'auto' not in pd:
+            return iter([])
+        auto = pd['auto']
+        return Judge.auto_generated_pairs(auto['generator'], auto['count'], auto.get('seed', 0))
+
+    @staticmethod
+    def auto_generated_pairs(function_name, n, seed=0):
         """The given function name is called n times from the AutoJudge class
-           to generate input/output pairs."""
-        f = getattr(AutoJudge, function_name)
-        return [f(i) for i in range(1, n+1)]
+           to generate inputs, and the matching reference solution gives each
+           expected output. Yields the input/output pairs lazily.
+           The same (function_name, n, seed) always gives the same pairs, so they
+           are cached on disk (see AutoJudge.cache_path) and later calls just
+           read them back."""
+        path = AutoJudge.cache_path(function_name, n, seed)
+        if path.is_file():
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield tuple(json.loads(line))
+            return
+        generate = getattr(AutoJudge, function_name)
+        reference = getattr(AutoJudge, function_name + '_reference')
+        tmpfile = Path(str(path) + '.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            cache = gzip.open(tmpfile, 'wt', encoding='utf-8')
+        except OSError:
+            cache = None
+        try:
+            for i in range(1, n+1):
+                datain = generate(Random(f'{function_name}:{seed}:{i}'))
+                status, expected, _ = Sandbox.execute(reference, datain)
+                if cache is not None:
+                    cache.write(json.dumps([datain, expected]) + '\n')
+                yield (datain, expected)
+            if cache is not None:
+                cache.close()
+                os.replace(tmpfile, path)
+                cache = None
+        finally:
+            if cache is not None:
+                cache.close()
+                tmpfile.unlink()
 
     @staticmethod
     def print_helpful_info(status, inputdata, useranswer, correctanswer):
@@ -503,7 +1708,7 @@ class Judge:
             print('--------------------------------------------------------')
             print('(WA) Incorrect answer given')
             print('Input data:')
-            for x in inputdata.split('\n'):
+            for x in str(inputdata).split('\n'):
                 print('  ', x)
             print('Expected answer:')
             for x in correctanswer.split('\n'):
@@ -517,7 +1722,7 @@ class Judge:
             print('--------------------------------------------------------')
             print('(RTE) Your code caused an error')
             print('Input data:')
-            for x in inputdata.split('\n'):
+            for x in str(inputdata).split('\n'):
                 print('  ', x)
             print('Error:')
             for x in str(useranswer).split('\n'):
@@ -528,34 +1733,1432 @@ class Judge:
             print('--------------------------------------------------------')
             print('(TLE) Time limit exceeded')
             print('Input data:')
-            for x in inputdata.split('\n'):
+            for x in str(inputdata).split('\n'):
+                print('  ', x)
+            print('^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^')
+        elif status == 'MLE':
+            print()
+            print('--------------------------------------------------------')
+            print(f'(MLE) Memory limit exceeded (more than {MEMORY_LIMIT} MB)')
+            print('Input data:')
+            for x in str(inputdata).split('\n'):
+                print('  ', x)
+            print('^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^')
+        elif status == 'OLE':
+            print()
+            print('--------------------------------------------------------')
+            print(f'(OLE) Output limit exceeded (more than {OUTPUT_LIMIT} characters)')
+            print('Input data:')
+            for x in str(inputdata).split('\n'):
+                print('  ', x)
+            print('Start of your answer:')
+            for x in useranswer.split('\n'):
                 print('  ', x)
             print('^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^')
 
     @staticmethod
-    def print_and_return_result_summary(results):
-        """Print the result (AC, WA, TLE, RTE) for each test case, and return
-           a dictionary of the counts for each status."""
-        prefix = { 'AC': '', 'WA': '    ', 'TLE': '        ', 'RTE': ' '*12 }
+    def print_and_return_result_summary(results, cases=None, numbers=None):
+        """Print the result (AC, WA, TLE, RTE, OLE, MLE, SKIP) for each test case,
+           with its time and memory use, and return a dictionary of the counts for
+           each status. If a list _cases_ is given, a dictionary for each test
+           case (see Judge.case_details) is appended to it.
+           The test cases are numbered 1, 2, ... unless a list _numbers_ is given;
+           it must hold the number of each result by the time it is produced
+           (see iter_fast_results)."""
+        prefix = { 'AC': '', 'WA': '    ', 'TLE': '        ', 'RTE': ' '*12, 'OLE': ' '*16,
+                   'MLE': ' '*20, 'SKIP': ' '*24 }
         summary = dict()
-        n = 0
         print()
-        for status, _, _, _ in results:
-            n += 1
-            print(f"Test {n:2d}: {prefix[status]}{status}")
+        for k, result in enumerate(results):
+            status, metrics = result.status, result.metrics
+            n = numbers[k] if numbers is not None else k + 1
+            column = f'{prefix[status]}{status}'
+            if status != 'SKIP':    # these are counted below instead
+                print(f"Test {n:2d}: {column:<24}{Judge.format_metrics(metrics)}")
             if status in summary:
                 summary[status] += 1
             else:
                 summary[status] = 1
+            if cases is not None:
+                cases.append(Judge.case_details(n, status, metrics))
+        if 'SKIP' in summary:
+            print(f"{summary['SKIP']:2d} more: {prefix['SKIP']}SKIP")
         return summary
 
+    @staticmethod
+    def format_metrics(metrics):
+        """E.g. '  0.013 s    2.4 MB' (blank for values that weren't measured)."""
+        metrics = metrics or dict()
+        wall, memory = metrics.get('wall'), metrics.get('memory')
+        wall = f'{wall:7.3f} s' if wall is not None else ' ' * 9
+        memory = f'{memory:7.1f} MB' if memory is not None else ''
+        return f'{wall}  {memory}'.rstrip()
+
+    @staticmethod
+    def case_details(n, status, metrics):
+        """A dictionary describing test case _n_, for l.report()."""
+        metrics = metrics or dict()
+        return {'test': n, 'status': status, 'seconds': metrics.get('wall'),
+                'cpu_seconds': metrics.get('cpu'), 'memory_mb': metrics.get('memory')}
+
+    @staticmethod
+    def report(number, pd, summary, cases):
+        """The dictionary returned by l.report()."""
+        return {'number': number, 'name': pd['name'], 'summary': summary, 'cases': cases}
+
 # --------------------------------------------------------------------------- #
 
-Interface.data = LIData()
+class Minimiser:
+    """Looks for a small input on which a function fails, so that
+       l.test(..., minimise=True) can show one even when the samples pass and
+       only the (secret) judging data fails. Candidate inputs are made afresh
+       by the problem's Scaler generator and the expected outputs come from the
+       AutoJudge reference solution, so nothing of the judging data is shown.
+       This is only possible for problems with both 'auto' and 'scale' entries.
 
-print("""
-=====================================================
-*    Welcome to the learninformatics environment    *
-*    Run l.help() to see available commands         *
-=====================================================
-""")
+       The first round tries every size up to MINIMISE_SMALL and then sizes
+       growing by half as much again up to the judge's largest. Each later round
+       tries new inputs, but only of sizes below the smallest failure so far, so
+       the failure that is kept keeps shrinking."""
+
+    @staticmethod
+    def supports(pd):
+        return 'auto' in pd and 'scale' in pd
+
+    @staticmethod
+    def sizes(maximum, below, first_round):
+        """The sizes tried in a round, smallest first."""
+        small = range(1, min(MINIMISE_SMALL, maximum) + 1) if first_round else []
+        large, size = [], MINIMISE_SMALL * 3 // 2
+        while size < maximum:
+            large.append(size)
+            size = size * 3 // 2
+        large.append(maximum)
+        return [size for size in chain(small, large) if size < below]
+
+    @staticmethod
+    def search(function, pd, workers, budget=MINIMISE_BUDGET):
+        """The Result (see Judge.verdict) for the smallest input found on
+           which _function_ doesn't give AC, or None if there is none. Candidates
+           are run on _workers_ Sandbox workers at once; no more are started
+           once _budget_ seconds have passed."""
+        reference = getattr(AutoJudge, pd['auto']['generator'] + '_reference')
+        generator, maximum = pd['scale']['generator'], pd['scale']['max']
+        generate = getattr(Scaler, generator)
+        deadline = time.monotonic() + budget
+        best, best_size = None, math.inf
+        for attempt in range(MINIMISE_ROUNDS):
+            sizes = []
+            def _pairs():
+                for size in Minimiser.sizes(maximum, best_size, attempt == 0):
+                    if time.monotonic() > deadline:
+                        return
+                    datain = generate(Random(f'{generator}:{size}:{attempt}'), size)
+                    status, expected, _ = Sandbox.execute(reference, datain)
+                    sizes.append(size)
+                    yield (datain, expected)
+            results = Judge.iter_results(function, _pairs(), workers,
+                                         limits=Judge.limits(pd), keep=True,
+                                         **Judge.comparison(pd))
+            try:
+                for i, result in enumerate(results):
+                    if result.status != 'AC':
+                        best, best_size = result, sizes[i]
+                        break
+            finally:
+                results.close()
+            if best_size <= MINIMISE_SMALL or time.monotonic() > deadline:
+                break
+        return best
+
+    @staticmethod
+    def print_counterexample(function, pd, data_version, cache=True):
+        """Searches (see search; this always uses every core) and prints what is
+           found, like a failed sample. The answer is kept in the ResultCache,
+           like the results of l.test."""
+        key = ResultCache.key(function, 'counterexample', pd, data_version)
+        found = ResultCache.get(key) if cache else None
+        if found is None:
+            print()
+            print(f'All samples passed; looking for a small input that fails '
+                  f'(for up to {MINIMISE_BUDGET:.0f} seconds)...')
+            found = [Minimiser.search(function, pd, Judge.worker_count(True))]
+            ResultCache.put(key, found)
+        if found[0] is None:
+            return
+        result = found[0]
+        print()
+        print('Your code fails on this input, which is not one of the samples:')
+        Judge.print_helpful_info(result.status, result.datain, result.dataout,
+                                 result.expected)
+
+# --------------------------------------------------------------------------- #
+
+class ResultCache:
+    """Remembers the results of l.test and l.judge for this session, so that
+       running them again on a function that hasn't changed gives the same
+       results straight away instead of running every test again.
+
+       The key is a hash of the function's code (see fingerprint) together
+       with the problem id, the data version and whether it was a test or a
+       judge, so that changing the function, or updating the data, means the
+       tests are run again. Only the RESULT_CACHE_SIZE most recently used
+       results are kept."""
+
+    entries = OrderedDict()
+
+    @staticmethod
+    def key(function, kind, pd, data_version):
+        """The cache key for running _function_ as _kind_ ('test' or 'judge')
+           on the problem with data _pd_."""
+        import hashlib
+        h = hashlib.sha256()
+        h.update(repr((SOFTWARE_VERSION, data_version, pd['id'], kind)).encode('utf-8'))
+        ResultCache.fingerprint(function, h, set())
+        return h.hexdigest()
+
+    @staticmethod
+    def get(key):
+        """The list of Results stored under _key_, or None."""
+        if key not in ResultCache.entries:
+            return None
+        ResultCache.entries.move_to_end(key)
+        return ResultCache.entries[key]
+
+    @staticmethod
+    def put(key, results):
+        ResultCache.entries[key] = list(results)
+        ResultCache.entries.move_to_end(key)
+        while len(ResultCache.entries) > RESULT_CACHE_SIZE:
+            ResultCache.entries.popitem(last=False)
+
+    @staticmethod
+    def recording(key, results):
+        """Yields each of the _results_ and, once they have all been yielded,
+           stores them under _key_. (Results that are only partly used, e.g.
+           because of Ctrl-C, are not stored.)"""
+        done = []
+        for result in results:
+            done.append(result)
+            yield result
+        ResultCache.put(key, done)
+
+    @staticmethod
+    def print_note(number):
+        print(f"(ex{number} hasn't changed since last time, so these are the same results;")
+        print(" use cache=False to run the tests again)")
+
+    @staticmethod
+    def fingerprint(function, h, seen):
+        """Feeds into the hash _h_ everything about _function_ that could change
+           its results: its code (bytecode, constants, names, nested functions),
+           its default arguments and closure, and the global values it refers
+           to. Global functions are fingerprinted in the same way, so changing a
+           helper function counts as changing the function. _seen_ holds the
+           ids of functions already done, so that recursion terminates."""
+        if id(function) in seen:
+            h.update(b'seen:' + function.__qualname__.encode('utf-8'))
+            return
+        seen.add(id(function))
+        code = function.__code__
+        ResultCache._fingerprint_code(code, h)
+        ResultCache._fingerprint_value(function.__defaults__, h, seen)
+        ResultCache._fingerprint_value(function.__kwdefaults__, h, seen)
+        for cell in function.__closure__ or ():
+            try:
+                ResultCache._fingerprint_value(cell.cell_contents, h, seen)
+            except ValueError:    # an empty cell
+                h.update(b'empty')
+        for name in sorted(ResultCache._global_names(code)):
+            if name in function.__globals__:
+                h.update(b'global:' + name.encode('utf-8'))
+                ResultCache._fingerprint_value(function.__globals__[name], h, seen)
+
+    @staticmethod
+    def _fingerprint_code(code, h):
+        h.update(code.co_code)
+        h.update(repr((code.co_names, code.co_varnames, code.co_freevars)).encode('utf-8'))
+        for const in code.co_consts:
+            if isinstance(const, CodeType):
+                ResultCache._fingerprint_code(const, h)
+            else:
+                h.update(repr(const).encode('utf-8'))
+
+    @staticmethod
+    def _global_names(code):
+        """The names used by _code_ and any code nested in it (these include
+           attribute names, which don't matter if there's no such global)."""
+        names = set(code.co_names)
+        for const in code.co_consts:
+            if isinstance(const, CodeType):
+                names |= ResultCache._global_names(const)
+        return names
+
+    @staticmethod
+    def _fingerprint_value(value, h, seen):
+        if isinstance(value, FunctionType):
+            ResultCache.fingerprint(value, h, seen)
+        elif isinstance(value, ModuleType):
+            h.update(b'module:' + value.__name__.encode('utf-8'))
+        elif isinstance(value, type) and value.__module__ == '__main__':
+            # A class of the user's own: its methods are what might change.
+            h.update(b'class:' + value.__qualname__.encode('utf-8'))
+            for name, attr in sorted(vars(value).items()):
+                attr = getattr(attr, '__func__', attr)    # staticmethod, classmethod
+                if isinstance(attr, FunctionType):
+                    h.update(name.encode('utf-8'))
+                    ResultCache.fingerprint(attr, h, seen)
+        else:
+            # The repr of most other objects includes their id, so a changed (or
+            # re-created) object counts as a change, which is the safe way round.
+            h.update(repr(value).encode('utf-8', 'replace'))
+
+# --------------------------------------------------------------------------- #
+
+class AutoJudge:
+    """Generators of extra judging cases, so that a problem can be judged on many
+       cases without them all being stored in the data file. A problem opts in
+       with an entry in private.yaml such as
+
+           auto:
+               generator: collatz
+               seed: 1
+               count: 50
+
+       For a generator called NAME there are two static methods:
+        * NAME(rng) returns one input (a string with real newlines), using only
+          the random.Random _rng_ for randomness, so it is reproducible
+        * NAME_reference(IN, OUT) is a reference solution, which gives the
+          expected output for that input
+       Generated cases are cached, so whenever a generator or reference changes,
+       increase its number in VERSIONS so that the old cases aren't used."""
+
+    VERSIONS = {'collatz': 1, 'factors': 1, 'stairway': 1}
+
+    @staticmethod
+    def cache_path(name, n, seed):
+        version = AutoJudge.VERSIONS[name]
+        return Path(CACHE_DIRECTORY) / 'auto' / f'{name}-v{version}-s{seed}-n{n}.jsonl.gz'
+
+    @staticmethod
+    def collatz(rng):
+        return f'{rng.randint(1, 10**6)}\n'
+
+    @staticmethod
+    def collatz_reference(IN, OUT):
+        n = int(IN.readline())
+        length = 1
+        while n != 1:
+            n = n // 2 if n % 2 == 0 else 3 * n + 1
+            length += 1
+        print(length, file=OUT)
+
+    @staticmethod
+    def factors(rng):
+        return f'{rng.randint(1, 10**6)}\n'
+
+    @staticmethod
+    def factors_reference(IN, OUT):
+        n = int(IN.readline())
+        count, i = 0, 1
+        while i * i <= n:
+            if n % i == 0:
+                count += 1 if i * i == n else 2
+            i += 1
+        print(count, file=OUT)
+
+    @staticmethod
+    def stairway(rng):
+        return f'{rng.randint(1, 90)}\n'
+
+    @staticmethod
+    def stairway_reference(IN, OUT):
+        n = int(IN.readline())
+        a, b = 1, 1
+        for _ in range(n):
+            a, b = b, a + b
+        print(a, file=OUT)
+
+# --------------------------------------------------------------------------- #
+
+class Scaler:
+    """Estimates how the running time of a function grows with the size of its
+       input (see Interface.scale). A problem opts in with an entry in
+       private.yaml such as
+
+           scale:
+               generator: number
+               max: 1000000
+
+       where _max_ is the size of the largest judging input. For a generator
+       called NAME there is a static method NAME(rng, size) that returns one
+       input (a string with real newlines) of roughly the given size, using
+       only the random.Random _rng_ for randomness.
+       What 'size' means is up to the generator: for 'number' it is the number
+       itself."""
+
+    # (name, log of the growth function), in order of preference when two
+    # fit about equally well. Sizes are always at least 2, so log(log(n)) is
+    # safe.
+    MODELS = [('O(1)',       lambda n: 0.0),
+              ('O(log n)',   lambda n: math.log(math.log(n))),
+              ('O(sqrt n)',  lambda n: 0.5 * math.log(n)),
+              ('O(n)',       lambda n: math.log(n)),
+              ('O(n log n)', lambda n: math.log(n) + math.log(math.log(n))),
+              ('O(n^2)',     lambda n: 2 * math.log(n)),
+              ('O(n^3)',     lambda n: 3 * math.log(n)),
+              ('O(2^n)',     lambda n: n * math.log(2))]
+
+    @staticmethod
+    def sizes(maximum):
+        """SCALE_STEPS sizes (fewer if some coincide), doubling up to _maximum_."""
+        return sorted(set(max(2, round(maximum / 2**k)) for k in range(SCALE_STEPS)))
+
+    @staticmethod
+    def measure(function, generator, maximum, limits=None):
+        """Runs the function on an input of each size from Scaler.sizes in a
+           Sandbox (with the given _limits_, see Judge.limits), SCALE_REPEATS
+           times, and yields (size, status, seconds) for
+           each size, where _seconds_ is the fastest run. Stops after a size that
+           takes SCALE_RUN_LIMIT seconds or more, or that doesn't run without
+           error (then _status_ is 'RTE', 'TLE' or 'MLE' and _seconds_ is None)."""
+        generate = getattr(Scaler, generator)
+        if Sandbox.is_supported():
+            time_limit, cpu_limit = limits or (TIME_LIMIT, CPU_TIME_LIMIT)
+            sandbox = Sandbox(function, time_limit=time_limit, cpu_limit=cpu_limit)
+            run = sandbox.run
+        else:
+            sandbox = None
+            run = lambda datain: Sandbox.execute(function, datain)
+        try:
+            for size in Scaler.sizes(maximum):
+                datain = generate(Random(f'{generator}:{size}'), size)
+                seconds = None
+                for _ in range(SCALE_REPEATS):
+                    status, _, metrics = run(datain)
+                    if status != 'OK':
+                        yield (size, status, None)
+                        return
+                    if seconds is None or metrics['wall'] < seconds:
+                        seconds = metrics['wall']
+                yield (size, 'OK', seconds)
+                if seconds >= SCALE_RUN_LIMIT:
+                    return
+        finally:
+            if sandbox is not None:
+                sandbox.close()
+
+    @staticmethod
+    def fit(points):
+        """Fits each of the MODELS to the (size, seconds) _points_, ignoring those
+           under SCALE_NOISE_FLOOR, by least squares on the logarithm of the time.
+           Returns (name, predict) where predict(size) estimates the seconds
+           taken, or None if fewer than three points are usable."""
+        points = [(n, t) for n, t in points if t >= SCALE_NOISE_FLOOR]
+        if len(points) < 3:
+            return None
+        fits = []
+        for name, logf in Scaler.MODELS:
+            residuals = [math.log(t) - logf(n) for n, t in points]
+            logc = sum(residuals) / len(residuals)
+            error = sum((r - logc)**2 for r in residuals) / len(residuals)
+            fits.append((error, name, logf, logc))
+        best = min(error for error, *_ in fits)
+        for error, name, logf, logc in fits:
+            if error <= best + 0.005:
+                break
+        def predict(n):
+            try:
+                return math.exp(logc + logf(n))
+            except OverflowError:
+                return math.inf
+        return (name, predict)
+
+    @staticmethod
+    def print_prediction(points, status, maximum, time_limit=TIME_LIMIT):
+        """Prints what the measured _points_ say about the largest judging input.
+           _status_ is that of the last size tried (see measure)."""
+        if status == 'RTE':
+            print("The code crashed on one of these inputs (try l.test to find out more).")
+            return
+        if status == 'MLE':
+            print(f"The code used more than {MEMORY_LIMIT} MB of memory on the last input.")
+            return
+        if status == 'TLE':
+            print("The last input took longer than the time limit of",
+                  f"{time_limit} seconds, and the judge's largest input has size",
+                  f"{maximum}: expect TLE.")
+            return
+        fit = Scaler.fit(points)
+        if points[-1][0] == maximum:
+            seconds = points[-1][1]
+            print(f"At the judge's largest size ({maximum}) it took "
+                  f"{Scaler.format_seconds(seconds)}.")
+        elif fit is None:
+            print("Every run was too quick to measure how the time grows.")
+            return
+        else:
+            seconds = fit[1](maximum)
+            print(f"At the judge's largest size ({maximum}) it should take about "
+                  f"{Scaler.format_seconds(seconds)}.")
+        if fit is not None:
+            print(f"The time taken seems to grow like {fit[0]}.")
+        if seconds > time_limit:
+            print(f"That is over the time limit of {time_limit} seconds: expect TLE.")
+        elif seconds > time_limit / 2:
+            print(f"That is close to the time limit of {time_limit} seconds.")
+        else:
+            print(f"That is well within the time limit of {time_limit} seconds.")
+
+    @staticmethod
+    def format_seconds(seconds):
+        if seconds == math.inf:
+            return 'forever'
+        elif seconds < 1:
+            return f'{seconds * 1000:.2f} ms'
+        elif seconds < 10**6:
+            return f'{seconds:.2f} s'
+        else:
+            return f'{seconds:.1e} s'
+
+    @staticmethod
+    def number(rng, size):
+        return f'{rng.randint(size - size // 10, size)}\n'
+
+# --------------------------------------------------------------------------- #
+
+class Profiler:
+    """Runs a function once under cProfile, in a Sandbox, for l.profile. The
+       report, made in the worker and sent back as JSON, gives the seconds
+       taken, the number of calls of each method of IN and OUT (see
+       CountingStream), the PROFILE_TOP functions with the most time of their
+       own and, optionally, the PROFILE_TOP lines of the user's code that take
+       the most time (measured in a second run, with sys.settrace)."""
+
+    DISABLE = "<method 'disable' of '_lsprof.Profiler' objects>"
+
+    @staticmethod
+    def choose_input(pd, samples):
+        """(input, description): a generated input of the judge's largest size
+           if the problem has a 'scale' entry, otherwise the largest sample."""
+        if 'scale' in pd:
+            generator, maximum = pd['scale']['generator'], pd['scale']['max']
+            datain = getattr(Scaler, generator)(Random(f'{generator}:{maximum}'), maximum)
+            return (datain, f"made up, of size {maximum} (like the judge's largest)")
+        datain = max((datain for datain, _ in samples), key=len)
+        return (datain, f'the largest sample ({len(datain)} characters)')
+
+    @staticmethod
+    def run(function, datain, lines, limits):
+        """Runs the function on _datain_ under the profiler. Returns (status,
+           report, metrics) like Sandbox.run, where _report_ is a dictionary if
+           the status is 'OK' (see Profiler). PROFILE_TIME_FACTOR times the
+           usual _limits_ are allowed, as profiling slows the code down."""
+        profiled = Profiler.profiled(function, lines)
+        time_limit, cpu_limit = (PROFILE_TIME_FACTOR * limit for limit in limits)
+        if Sandbox.is_supported():
+            with Sandbox(profiled, time_limit=time_limit, cpu_limit=cpu_limit) as sandbox:
+                status, output, metrics = sandbox.run(datain)
+        else:
+            status, output, metrics = Sandbox.execute(profiled, datain)
+        return (status, json.loads(output) if status == 'OK' else output, metrics)
+
+    @staticmethod
+    def profiled(function, lines):
+        """A function that runs _function_ on a copy of its input, with its
+           output thrown away, and writes the report (as JSON) as its output."""
+        def _profiled(IN, OUT):
+            import cProfile, pstats
+            datain = IN.read()
+            calls = dict()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                function(CountingStream(StringIO(datain), 'IN', calls),
+                         CountingStream(StringIO(), 'OUT', calls))
+            finally:
+                profiler.disable()
+            report = {'seconds': time.perf_counter() - start, 'calls': calls,
+                      'functions': Profiler.hot_functions(pstats.Stats(profiler).stats)}
+            if lines:
+                report['lines'] = Profiler.hot_lines(function, datain)
+            OUT.write(json.dumps(report))
+        return _profiled
+
+    @staticmethod
+    def hot_functions(stats):
+        """[calls, own seconds, total seconds, description] for the functions in
+           the pstats _stats_ with the most time of their own, leaving out this
+           module's (CountingStream's and the profiler's own) and the built-in
+           functions only they call."""
+        rows = []
+        for (filename, line, name), (_, calls, own, total, callers) in stats.items():
+            if filename == __file__ or name == Profiler.DISABLE:
+                continue
+            if filename == '~' and all(caller[0] == __file__ for caller in callers):
+                continue
+            where = name if filename == '~' else f'{name} ({Path(filename).name}:{line})'
+            rows.append([calls, own, total, where])
+        rows.sort(key=lambda row: -row[1])
+        return rows[:PROFILE_TOP]
+
+    @staticmethod
+    def hot_lines(function, datain):
+        """[hits, seconds, where, source] for the lines of the function's file
+           that take the most time, including the time of the calls they make."""
+        import linecache
+        filename = function.__code__.co_filename
+        times, hits, current = dict(), dict(), dict()
+        def _trace(frame, event, arg):
+            if frame.f_code.co_filename != filename:
+                return None
+            return _line
+        def _line(frame, event, arg):
+            now = time.perf_counter()
+            if frame in current:
+                line, start = current[frame]
+                times[line] = times.get(line, 0.0) + now - start
+            if event == 'return':
+                current.pop(frame, None)
+            else:
+                if event == 'line':
+                    hits[frame.f_lineno] = hits.get(frame.f_lineno, 0) + 1
+                current[frame] = (frame.f_lineno, time.perf_counter())
+            return _line
+        sys.settrace(_trace)
+        try:
+            function(StringIO(datain), StringIO())
+        finally:
+            sys.settrace(None)
+        rows = [[hits.get(line, 0), seconds, f'{Path(filename).name}:{line}',
+                 linecache.getline(filename, line).strip()]
+                for line, seconds in times.items()]
+        rows.sort(key=lambda row: -row[1])
+        return rows[:PROFILE_TOP]
+
+    @staticmethod
+    def print_report(report):
+        print(f"Finished in {Scaler.format_seconds(report['seconds'])} "
+              f"(profiling slows code down, so it runs faster when judged)")
+        print()
+        print("Calls of IN and OUT:")
+        if not report['calls']:
+            print("    (none)")
+        for name, calls in sorted(report['calls'].items()):
+            print(f"    {calls:>10}  {name}")
+        for stream, advice in [('IN', "read all of the input at once with IN.read() "
+                                      "and split it up"),
+                               ('OUT', "collect the output in a list and write "
+                                       "'\n'.join(...) once at the end")]:
+            calls = sum(n for name, n in report['calls'].items()
+                        if name.startswith(stream))
+            if calls >= PROFILE_MANY_CALLS:
+                print(f"  Using {stream} {calls} times is slow: {advice}.")
+        print()
+        print("Functions taking the most time of their own:")
+        print(f"    {'calls':>10}  {'own time':>10}  {'total time':>10}  function")
+        for calls, own, total, where in report['functions']:
+            print(f"    {calls:>10}  {Scaler.format_seconds(own):>10}  "
+                  f"{Scaler.format_seconds(total):>10}  {where}")
+        if 'lines' in report:
+            print()
+            print("Lines taking the most time (including the calls they make):")
+            print(f"    {'runs':>10}  {'time':>10}  line")
+            for hits, seconds, where, source in report['lines']:
+                taken = Scaler.format_seconds(seconds)
+                print(f"    {hits:>10}  {taken:>10}  {where}  {source}")
+
+
+class CountingStream:
+    """Wraps IN or OUT (a stream) for the Profiler, counting the calls of each of
+       its methods, by name, in the dictionary _calls_. Looping over it (for
+       line in IN) counts as calls of __next__."""
+
+    def __init__(s, stream, name, calls):
+        s._stream = stream
+        s._name = name
+        s._calls = calls
+
+    def __getattr__(s, attribute):
+        value = getattr(s._stream, attribute)
+        if not callable(value):
+            return value
+        key, calls = f'{s._name}.{attribute}', s._calls
+        def _counted(*args, **kwargs):
+            calls[key] = calls.get(key, 0) + 1
+            return value(*args, **kwargs)
+        setattr(s, attribute, _counted)    # so __getattr__ isn't needed next time
+        return _counted
+
+    def __iter__(s):
+        return s
+
+    def __next__(s):
+        key = f'{s._name}.__next__'
+        s._calls[key] = s._calls.get(key, 0) + 1
+        return next(s._stream)
+
+# --------------------------------------------------------------------------- #
+
+class Result:
+    """The result of one test case (see Judge.verdict). Only the status and
+       metrics are its own: the case (datain, expected) is the pair given by the
+       case store (see LIData.cases), so the strings are shared with it rather
+       than copied, and the output is kept only when it may be shown (for a
+       failure in l.test), otherwise it is None. A long l.judge, or a batch of
+       them, therefore holds little more than the statuses and metrics.
+       metrics is a dictionary with the 'wall' and 'cpu' time (seconds) and
+       peak 'memory' (megabytes) used; 'cpu' and 'memory' may be None, and
+       metrics itself is None for a case that wasn't run ('SKIP')."""
+
+    __slots__ = ('status', 'case', 'dataout', 'metrics')
+
+    def __init__(s, status, case, dataout=None, metrics=None):
+        s.status = status
+        s.case = case
+        s.dataout = dataout
+        s.metrics = metrics
+
+    @property
+    def datain(s):
+        return s.case[0]
+
+    @property
+    def expected(s):
+        return s.case[1].strip()
+
+# --------------------------------------------------------------------------- #
+
+class CaseSet:
+    """The test cases of one dataset of a problem (see LIData.cases), stored
+       compactly and normalised once: each input has real newlines, each
+       expected output is stripped of leading and trailing whitespace (which
+       is never significant, see OutputChecker), and each input's size is
+       precomputed. Iterating over it gives (input, expected) pairs, as
+       Judge expects.
+       It is not changed after it is made, so it can be shared by every run."""
+
+    __slots__ = ('inputs', 'expected', 'sizes')
+
+    def __init__(s, pairs):
+        inputs, expected = [], []
+        for datain, dataout in pairs:
+            inputs.append(datain)
+            expected.append(dataout.strip())
+        s.inputs = tuple(inputs)
+        s.expected = tuple(expected)
+        s.sizes = tuple(len(datain) for datain in inputs)
+
+    def __iter__(s):
+        return zip(s.inputs, s.expected)
+
+    def __len__(s):
+        return len(s.inputs)
+
+# --------------------------------------------------------------------------- #
+
+class LargeInput:
+    """Stands in for the input string of a large test, which is kept in its own
+       gzip-compressed file (see LIData.large_pairs). Only this small object is
+       sent to a Sandbox worker, which opens the file there as a stream, so the
+       input is never held in memory as a whole."""
+
+    def __init__(s, path, size):
+        s.path = str(Path(path).resolve())    # a worker may have another cwd
+        s.size = size
+
+    def open(s):
+        """A text stream of the (decompressed) input, suitable as IN."""
+        return gzip.open(s.path, 'rt', encoding='utf-8')
+
+    def __str__(s):
+        return f'(large input from {Path(s.path).name}: {s.size} characters)'
+
+
+class MappedInput(RawIOBase):
+    """A file memory-mapped as a raw binary stream, for l.run: reading from it
+       copies only what is asked for out of the mapping, so a big input file is
+       never read into memory as a whole. open and wrap give a text stream of
+       it, suitable as IN."""
+
+    def __init__(s, f):
+        s.file = f
+        s.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        s.position = 0
+
+    @staticmethod
+    def open(path):
+        return MappedInput.wrap(open(path, 'rb'))
+
+    @staticmethod
+    def wrap(f):
+        """A text stream of the binary file _f_, mapped if it is a real file
+           that isn't empty (mmap can do neither pipes nor empty files)."""
+        try:
+            raw = MappedInput(f)
+        except (OSError, ValueError, AttributeError):
+            return TextIOWrapper(f, encoding='utf-8')
+        return TextIOWrapper(BufferedReader(raw), encoding='utf-8')
+
+    def readable(s):
+        return True
+
+    def readinto(s, b):
+        n = min(len(b), len(s.map) - s.position)
+        b[:n] = s.map[s.position:s.position + n]
+        s.position += n
+        return n
+
+    def close(s):
+        if not s.closed:
+            s.map.close()
+            s.file.close()
+        super().close()
+
+
+class LineInput(TextIOBase):
+    """A text stream, for l.run, made from an iterable of lines (such as a
+       generator), which is only consumed as the stream is read. A newline is
+       added to any line that doesn't end with one."""
+
+    def __init__(s, lines):
+        s.lines = iter(lines)
+        s.pending = ''
+
+    def readable(s):
+        return True
+
+    def _more(s):
+        """Adds the next line to what is pending; False if there are no more."""
+        line = next(s.lines, None)
+        if line is None:
+            return False
+        s.pending += line if line.endswith('\n') else line + '\n'
+        return True
+
+    def readline(s, size=-1):
+        while '\n' not in s.pending and s._more():
+            pass
+        end = s.pending.find('\n') + 1 or len(s.pending)
+        if size is not None and 0 <= size < end:
+            end = size
+        line, s.pending = s.pending[:end], s.pending[end:]
+        return line
+
+    def read(s, size=-1):
+        if size is None or size < 0:
+            while s._more():
+                pass
+            size = len(s.pending)
+        while len(s.pending) < size and s._more():
+            pass
+        data, s.pending = s.pending[:size], s.pending[size:]
+        return data
+
+
+class CountingOutput(TextIOBase):
+    """OUT for l.run(..., out=False): throws the output away, counting its
+       characters and lines."""
+
+    def __init__(s):
+        s.characters = 0
+        s.lines = 0
+
+    def writable(s):
+        return True
+
+    def write(s, text):
+        s.characters += len(text)
+        s.lines += text.count('\n')
+        return len(text)
+
+
+class CpuTimeExceeded(BaseException):
+    """Raised inside a sandbox worker when a test case uses up its CPU time.
+       It is a BaseException so that a student's 'except Exception' cannot
+       swallow it."""
+
+
+class EarlyVerdict(BaseException):
+    """Raised by OutputChecker to stop the user's function as soon as the
+       verdict ('WA' or 'OLE') is certain."""
+    def __init__(s, status):
+        super().__init__(status)
+        s.status = status
+
+
+class OutputChecker:
+    """Used as OUT when judging a test case. Output is compared with the
+       expected output as it is written, instead of being collected and
+       compared at the end, so memory use is bounded and a wrong answer stops
+       the user's function at the first difference (EarlyVerdict).
+       Only the first OUTPUT_KEPT characters are kept, to show the user.
+
+       The comparison _rule_ is one of:
+        * 'exact'  - the output must equal the expected output, ignoring
+                     leading and trailing whitespace (the original rule)
+        * 'tokens' - the words of the output must equal those expected; the
+                     amount and kind of whitespace between them doesn't matter
+        * 'float'  - as for 'tokens', but two numbers are equal if they differ
+                     by at most _tolerance_ (relative, for numbers above 1)
+       More than _limit_ characters of output gives 'OLE'."""
+
+    RULES = ['exact', 'tokens', 'float']
+
+    def __init__(s, expected, rule='exact', tolerance=FLOAT_TOLERANCE, limit=OUTPUT_LIMIT):
+        if rule not in ('exact', 'tokens', 'float'):
+            raise ValueError(f'Unknown comparison rule: {rule}')
+        s.rule = rule
+        s.tolerance = tolerance
+        s.limit = limit
+        s.expected = expected.strip()
+        s.expected_tokens = s.expected.split() if rule != 'exact' else None
+        s.position = 0        # characters (exact) or tokens matched so far
+        s.started = False     # whether any non-whitespace output has arrived
+        s.partial = ''        # a token that may continue in the next write
+        s.written = 0
+        s.kept = []
+        s.n_kept = 0
+        s.verdict = None      # set once the answer is known to be wrong
+
+    def write(s, text):
+        if s.verdict is not None:
+            raise EarlyVerdict(s.verdict)
+        s.written += len(text)
+        if s.n_kept < OUTPUT_KEPT:
+            s.kept.append(text[:OUTPUT_KEPT - s.n_kept])
+            s.n_kept += len(s.kept[-1])
+        try:
+            if s.written > s.limit:
+                raise EarlyVerdict('OLE')
+            if s.rule == 'exact':
+                s._feed_exact(text)
+            else:
+                s._feed_tokens(text)
+        except EarlyVerdict as verdict:
+            s.verdict = verdict.status
+            raise
+        return len(text)
+
+    def writelines(s, lines):
+        for line in lines:
+            s.write(line)
+
+    def flush(s):
+        pass
+
+    def output(s):
+        """The output that was kept."""
+        return ''.join(s.kept)
+
+    def finish(s):
+        """The verdict, 'AC' or 'WA' (or 'OLE'), once the user's function has
+           finished."""
+        if s.verdict is not None:
+            return s.verdict
+        if s.rule == 'exact':
+            return 'AC' if s.position == len(s.expected) else 'WA'
+        if s.partial:
+            s._match_token(s.partial)
+            s.partial = ''
+        return 'AC' if s.position == len(s.expected_tokens) else 'WA'
+
+    def _feed_exact(s, text):
+        if not s.started:
+            text = text.lstrip()
+            if not text:
+                return
+            s.started = True
+        remaining = len(s.expected) - s.position
+        if remaining > 0:
+            part = text[:remaining]
+            if part != s.expected[s.position:s.position + len(part)]:
+                raise EarlyVerdict('WA')
+            s.position += len(part)
+            text = text[len(part):]
+        if text and not text.isspace():
+            raise EarlyVerdict('WA')
+
+    def _feed_tokens(s, text):
+        text = s.partial + text
+        tokens = text.split()
+        if tokens and not text[-1].isspace():
+            s.partial = tokens.pop()
+        else:
+            s.partial = ''
+        for token in tokens:
+            s._match_token(token)
+
+    def _match_token(s, token):
+        if s.position >= len(s.expected_tokens):
+            raise EarlyVerdict('WA')
+        expected = s.expected_tokens[s.position]
+        if token != expected and not (s.rule == 'float' and s._close(token, expected)):
+            raise EarlyVerdict('WA')
+        s.position += 1
+
+    def _close(s, token, expected):
+        try:
+            a, b = float(token), float(expected)
+        except ValueError:
+            return False
+        return abs(a - b) <= s.tolerance * max(1.0, abs(b))
+
+
+class CollectedOutput(StringIO):
+    """Used as OUT in place of an OutputChecker when the function being judged
+       must not be able to reach the expected output (see Sandbox.imap_jobs).
+       The output is only collected, up to _limit_ characters ('OLE' beyond
+       that), and is checked afterwards in the process that has the checker.
+       finish and output are as for OutputChecker, but the verdict is 'OK'."""
+
+    def __init__(s, limit=OUTPUT_LIMIT):
+        super().__init__()
+        s.limit = limit
+        s.written = 0
+        s.verdict = None
+
+    def write(s, text):
+        if s.verdict is not None:
+            raise EarlyVerdict(s.verdict)
+        s.written += len(text)
+        if s.written > s.limit:
+            s.verdict = 'OLE'
+            raise EarlyVerdict('OLE')
+        return super().write(text)
+
+    def output(s):
+        return s.getvalue() if s.verdict is None else s.getvalue()[:OUTPUT_KEPT]
+
+    def finish(s):
+        return 'OK' if s.verdict is None else s.verdict
+
+
+class Calibration:
+    """Measures how fast this computer runs Python, so that time limits (see
+       Judge.limits) can be scaled to match the reference computer (where the
+       judging server runs). The speed factor is the time Calibration.workload
+       takes here divided by CALIBRATION_SECONDS, its time on the reference
+       computer: 2.0 means this computer is half as fast, so twice the time is
+       allowed. It is kept within SPEED_FACTOR_RANGE.
+
+       One measurement can be thrown off by whatever else the computer is
+       doing, so the factor is the median of the last CALIBRATION_KEPT
+       measurements on this computer (and version of Python), which are
+       remembered in CACHE_DIRECTORY. A session adds a measurement when it first
+       needs the factor, unless the last one is less than CALIBRATION_INTERVAL
+       seconds old. l.calibrate() replaces them all with new ones."""
+
+    factor = None      # this computer's speed factor, once known this session
+
+    @staticmethod
+    def speed_factor():
+        if Calibration.factor is None:
+            measurements = Calibration.load()
+            now = time.time()
+            if not measurements or now - measurements[-1][0] > CALIBRATION_INTERVAL:
+                measurements.append([now, Calibration.measure()])
+                Calibration.save(measurements)
+            Calibration.factor = Calibration.median(measurements)
+        return Calibration.factor
+
+    @staticmethod
+    def calibrate():
+        """Forgets the measurements, takes CALIBRATION_KEPT new ones and returns
+           the new speed factor."""
+        measurements = [[time.time(), Calibration.measure()]
+                        for _ in range(CALIBRATION_KEPT)]
+        Calibration.save(measurements)
+        Calibration.factor = Calibration.median(measurements)
+        return Calibration.factor
+
+    @staticmethod
+    def median(measurements):
+        import statistics
+        return round(statistics.median(factor for _, factor in measurements), 3)
+
+    @staticmethod
+    def load():
+        """The remembered measurements [[time, factor], ...], oldest first, or an
+           empty list if there are none for this computer."""
+        try:
+            saved = json.loads((Path(CACHE_DIRECTORY) / 'speed.json').read_text())
+            if (saved['host'] == Calibration.host()
+                    and saved['seconds'] == CALIBRATION_SECONDS):
+                return [[float(t), float(factor)] for t, factor in saved['measurements']]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return []
+
+    @staticmethod
+    def save(measurements):
+        """Remembers the last CALIBRATION_KEPT measurements; failure to write
+           them is not a problem."""
+        saved = {'host': Calibration.host(), 'seconds': CALIBRATION_SECONDS,
+                 'measurements': measurements[-CALIBRATION_KEPT:]}
+        path = Path(CACHE_DIRECTORY) / 'speed.json'
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            Updater.replace_file(path, json.dumps(saved).encode('utf-8'))
+        except OSError:
+            pass
+
+    @staticmethod
+    def measure():
+        """One measurement: runs the workload once to warm up, then
+           CALIBRATION_RUNS times, and returns the speed factor from the
+           quickest run."""
+        Calibration.workload(CALIBRATION_LOOPS)
+        seconds = math.inf
+        for _ in range(CALIBRATION_RUNS):
+            start = time.perf_counter()
+            Calibration.workload(CALIBRATION_LOOPS)
+            seconds = min(seconds, time.perf_counter() - start)
+        low, high = SPEED_FACTOR_RANGE
+        return round(min(high, max(low, seconds / CALIBRATION_SECONDS)), 3)
+
+    @staticmethod
+    def workload(n):
+        """Work like that of a typical solution: arithmetic, strings and a
+           dictionary."""
+        counts = dict()
+        total = 0
+        for i in range(n):
+            total += i * i % 7
+            word = str(i)
+            counts[word[-1]] = counts.get(word[-1], 0) + 1
+        return total, sorted(counts.items())
+
+    @staticmethod
+    def host():
+        """What identifies this computer and Python, for the cached factor."""
+        import platform
+        return ' '.join([platform.node(), platform.machine(),
+                         platform.python_implementation(), platform.python_version()])
+
+
+class Sandbox:
+    """A small pool of worker processes that run one user function (or a
+       dictionary of them, see imap_jobs) on many test cases. The workers are
+       forked once, when the sandbox is created, and are then reused for every
+       case, so the cost of forking is not paid per case.
+       With more than one worker, cases are run in parallel (see imap).
+
+       Each case is limited to TIME_LIMIT seconds of wall-clock time (enforced
+       here, by killing the worker), CPU_TIME_LIMIT seconds of CPU time (unless
+       other limits are given, see Judge.limits) and MEMORY_LIMIT megabytes of
+       memory (enforced by the worker itself). A worker that is killed, or that
+       dies, is replaced by a freshly forked one.
+
+       The 'fork' start method is required because the user's function lives in
+       the interactive session and cannot be pickled. Use as a context manager:
+
+           with Sandbox(function) as sandbox:
+               status, output, metrics = sandbox.run('56\n42\n')
+
+       Submissions (see imap_jobs) are kept a little further from the judging
+       data, and from each other: they never see an OutputChecker, each one
+       has a worker to itself, and the workers can be given a _directory_ of
+       their own to work in. This is not real isolation. A
+       worker is a fork of this process and runs as the same user, so code that
+       goes looking can still read any file this user can, or find the judging
+       data in memory. Untrusted code should only be judged with the whole
+       process run as an unprivileged user, in a container or virtual machine
+       that holds nothing else of value."""
+
+    def __init__(s, function, size=SANDBOX_WORKERS, time_limit=TIME_LIMIT,
+                 cpu_limit=CPU_TIME_LIMIT, memory_limit=MEMORY_LIMIT, directory=None):
+        if isinstance(function, dict):
+            s.functions = function
+        else:
+            s.functions = {None: function}
+        s.time_limit = time_limit
+        s.cpu_limit = cpu_limit
+        s.memory_limit = memory_limit
+        s.directory = directory and str(directory)
+        import multiprocessing
+        s.context = multiprocessing.get_context('fork')
+        s.workers = [s._fork() for _ in range(max(1, size))]
+        s.last_keys = dict()   # worker index -> key of its last job, until replaced
+
+    @staticmethod
+    def is_supported():
+        import multiprocessing
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    def __enter__(s):
+        return s
+
+    def __exit__(s, *exc_info):
+        s.close()
+
+    def close(s):
+        """Asks each worker to finish, and kills any that don't."""
+        for process, conn in s.workers:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for process, conn in s.workers:
+            process.join(0.5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            conn.close()
+        s.workers = []
+
+    def run(s, datain, checker=None):
+        """Runs the function on the input string _datain_. Without a _checker_
+           (an OutputChecker), returns ('OK', output, metrics); with one, returns
+           (verdict, kept output, metrics) where verdict is 'AC', 'WA' or 'OLE'.
+           Otherwise returns ('RTE', exception, metrics), ('TLE', None, metrics)
+           or ('MLE', None, metrics).
+           metrics is a dictionary: 'wall' and 'cpu' are the elapsed and
+           processor time in seconds, 'memory' is the peak memory used by the
+           case in megabytes. 'cpu' and 'memory' are None if unknown."""
+        return next(s.imap([(datain, checker)]))
+
+    def imap(s, cases):
+        """Runs the function on each case (datain, checker) from the iterable
+           _cases_, handing them out to whichever workers are idle. Yields the
+           outcomes (as for run) in the same order as the cases, each one as
+           soon as it and all earlier ones have finished."""
+        return s.imap_jobs((None, datain, checker) for datain, checker in cases)
+
+    def imap_jobs(s, jobs):
+        """As for imap, but each job is a tuple (key, datain, checker) and the
+           function run is the one stored under _key_ in the sandbox's
+           dictionary of functions, or _key_ itself if it is a Submission. This
+           lets one pool judge many exercises (or submissions) at once.
+           A job may have a fourth item, the (wall-clock, CPU) limits for that
+           case (see Judge.limits), in place of the sandbox's own.
+           The checker of a Submission's job is kept here: the worker is sent a
+           CollectedOutput instead, and the output it sends back is checked
+           here, so the expected output never reaches the submission's OUT.
+           A worker that has run a job of another key is replaced before it
+           runs a Submission's job, so each submission starts in a fresh
+           process, whatever earlier ones did to it."""
+        from multiprocessing.connection import wait
+        inputs = iter(jobs)
+        busy = dict()        # worker index -> (case number, deadline, time limit)
+        finished = dict()    # case number -> outcome
+        checkers = dict()    # case number -> checker kept back from a Submission
+        n_sent, n_yielded = 0, 0
+        more = True
+        while True:
+            for i in range(len(s.workers)):
+                if more and i not in busy:
+                    job = next(inputs, None)
+                    if job is None:
+                        more = False
+                        break
+                    if len(job) > 3:
+                        time_limit, cpu_limit = job[3]
+                        job = job[:3] + (cpu_limit,)
+                    else:
+                        time_limit = s.time_limit
+                    if isinstance(job[0], Submission):
+                        if s.last_keys.get(i, job[0]) is not job[0]:
+                            s._replace(i)
+                        if job[2] is not None:
+                            checkers[n_sent] = job[2]
+                            job = (job[0], job[1], CollectedOutput(job[2].limit)) + job[3:]
+                    s.last_keys[i] = job[0]
+                    s.workers[i][1].send(job)
+                    busy[i] = (n_sent, time.monotonic() + time_limit, time_limit)
+                    n_sent += 1
+            if not busy:
+                return
+            timeout = min(deadline for _, deadline, _ in busy.values()) - time.monotonic()
+            ready = wait([s.workers[i][1] for i in busy], max(0, timeout))
+            now = time.monotonic()
+            for i, (n, deadline, time_limit) in list(busy.items()):
+                conn = s.workers[i][1]
+                if conn in ready:
+                    try:
+                        finished[n] = Sandbox._check(conn.recv(), checkers.get(n))
+                    except EOFError:
+                        s._replace(i)
+                        finished[n] = ('RTE', RuntimeError('Your code ended the Python process'),
+                                       {'wall': now + time_limit - deadline,
+                                        'cpu': None, 'memory': None})
+                elif now >= deadline:
+                    s._replace(i)
+                    finished[n] = ('TLE', None, {'wall': time_limit, 'cpu': None,
+                                                 'memory': None})
+                else:
+                    continue
+                del busy[i]
+                checkers.pop(n, None)
+            while n_yielded in finished:
+                yield finished.pop(n_yielded)
+                n_yielded += 1
+
+    @staticmethod
+    def _check(outcome, checker):
+        """The outcome of a job whose output was collected (see CollectedOutput),
+           once the output is given to the job's _checker_ (if it has one)."""
+        status, output, metrics = outcome
+        if checker is None or status != 'OK':
+            return outcome
+        try:
+            checker.write(output)
+            status = checker.finish()
+        except EarlyVerdict as verdict:
+            status = verdict.status
+        return (status, checker.output(), metrics)
+
+    def _replace(s, i):
+        """Kills worker i (it may be stuck in an infinite loop) and forks a new
+           one in its place."""
+        process, conn = s.workers[i]
+        process.kill()
+        process.join()
+        conn.close()
+        s.workers[i] = s._fork()
+        s.last_keys.pop(i, None)
+
+    def _fork(s):
+        parent_conn, child_conn = s.context.Pipe()
+        process = s.context.Process(target=Sandbox._worker,
+                                    args=(s.functions, child_conn, s.cpu_limit,
+                                          s.memory_limit, s.directory),
+                                    daemon=True)
+        process.start()
+        child_conn.close()
+        return (process, parent_conn)
+
+    @staticmethod
+    def execute(function, datain, checker=None, cpu_limit=None, memory_limit=None):
+        """Runs the function on the input string (or LargeInput) _datain_ in this
+           process. Returns an outcome as described in run.
+           The limits are only applied when given (as they are in a worker), and
+           only where the platform supports them; the memory limit is applied
+           afterwards too, to the peak memory measured."""
+        _in = datain.open() if isinstance(datain, LargeInput) else StringIO(datain)
+        _out = StringIO() if checker is None else checker
+        memory_before = Sandbox._memory_reset()
+        address_limit = Sandbox._limit_address_space(memory_limit)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            if cpu_limit and hasattr(signal, 'setitimer'):
+                signal.setitimer(signal.ITIMER_PROF, cpu_limit)
+            try:
+                function(_in, _out)
+            finally:
+                if cpu_limit and hasattr(signal, 'setitimer'):
+                    signal.setitimer(signal.ITIMER_PROF, 0)
+            if checker is None:
+                outcome = ('OK', _out.getvalue())
+            else:
+                outcome = (checker.finish(), checker.output())
+        except EarlyVerdict as verdict:
+            outcome = (verdict.status, checker.output())
+        except CpuTimeExceeded:
+            outcome = ('TLE', None)
+        except MemoryError:
+            outcome = ('MLE', None)
+        except Exception as exc:
+            outcome = ('RTE', exc)
+        finally:
+            _in.close()
+            Sandbox._restore_address_space(address_limit)
+        metrics = {'wall': time.perf_counter() - start,
+                   'cpu': time.process_time() - cpu_start,
+                   'memory': Sandbox._memory_peak(memory_before)}
+        if (memory_limit and metrics['memory'] is not None and metrics['memory'] > memory_limit
+                and outcome[0] not in ('TLE', 'RTE')):
+            outcome = ('MLE', None)
+        return outcome + (metrics,)
+
+    @staticmethod
+    def _proc_status(field):
+        """The value in kB of _field_ (e.g. 'VmRSS') for this process, from
+           /proc/self/status, or None if that isn't available (not Linux)."""
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith(field + ':'):
+                        return int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+    @staticmethod
+    def _memory_reset():
+        """Resets the peak memory (Linux) and returns the current memory use in kB,
+           or None if it can't be measured."""
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            pass
+        return Sandbox._proc_status('VmRSS')
+
+    @staticmethod
+    def _memory_peak(before):
+        """Megabytes of memory used at the peak since _memory_reset, or None."""
+        peak = Sandbox._proc_status('VmHWM')
+        if peak is None or before is None:
+            return None
+        return round(max(0, peak - before) / 1024, 1)
+
+    @staticmethod
+    def _limit_address_space(memory_limit):
+        """Stops this process growing by more than _memory_limit_ megabytes, so
+           that a runaway allocation ends in MemoryError rather than exhausting
+           the machine. Returns the previous limit, to restore, or None."""
+        size = Sandbox._proc_status('VmSize')
+        if not memory_limit or size is None:
+            return None
+        try:
+            import resource
+            previous = resource.getrlimit(resource.RLIMIT_AS)
+            limit = size * 1024 + memory_limit * 1024 * 1024
+            if previous[1] != resource.RLIM_INFINITY:
+                limit = min(limit, previous[1])
+            resource.setrlimit(resource.RLIMIT_AS, (limit, previous[1]))
+            return previous
+        except (ImportError, ValueError, OSError):
+            return None
+
+    @staticmethod
+    def _restore_address_space(previous):
+        if previous is not None:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, previous)
+
+    @staticmethod
+    def _worker(functions, conn, cpu_limit, memory_limit, directory=None):
+        """The loop run in each worker process (in _directory_, if given):
+           receive a job (key, datain, checker) or (key, datain, checker,
+           cpu_limit), run the function on it, send back the outcome. A None job
+           means stop."""
+        def _cpu_time_exceeded(signum, frame):
+            raise CpuTimeExceeded()
+        if directory is not None:
+            os.chdir(directory)
+        if hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGPROF, _cpu_time_exceeded)
+        while True:
+            try:
+                job = conn.recv()
+            except (EOFError, KeyboardInterrupt):
+                break
+            if job is None:
+                break
+            key, datain, checker = job[:3]
+            function = key if isinstance(key, Submission) else functions[key]
+            reply = Sandbox.execute(function, datain, checker,
+                                    job[3] if len(job) > 3 else cpu_limit, memory_limit)
+            try:
+                conn.send(reply)
+            except Exception:
+                # The exception could not be pickled; send its message instead.
+                conn.send(('RTE', RuntimeError(str(reply[1])), reply[2]))
+
+# --------------------------------------------------------------------------- #
+
+if os.environ.get(BANNER_VARIABLE, '0') != '0':
+    welcome()